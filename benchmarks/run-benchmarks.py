@@ -0,0 +1,184 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import argparse
+import contextlib
+import glob
+import json
+import os
+import platform
+import resource
+import runpy
+import shlex
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+import synthetic_connect
+
+# Runs create-source-manifest-file.py and create-contact-flow-template.py against a synthetic Connect instance
+# and writes the wall time, API calls, peak memory and output size of every run to a JSON file.
+#
+# Each run is a separate process so the peak memory of one run does not hide the next one.  The process runs
+# the script with the boto3 clients replaced by the stand-in in synthetic_connect.py.
+
+REPOSITORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SCRIPTS = [
+    {
+        "name": "create-source-manifest-file.py",
+        "arguments": "manifest_args",
+        "outputs": lambda config: [config["Output"]["ManifestFileName"]]
+    },
+    {
+        "name": "create-contact-flow-template.py",
+        "arguments": "template_args",
+        "outputs": lambda config: [os.path.splitext(config["Output"]["Filename"])[0] + "*.json"]
+    }
+]
+
+# Shapes for the cases that are measured regularly.  The shape arguments given on the command line override them.
+#   many-mappings - 5000 PhoneNumberMappings, every content is rewritten with all of them
+CASES = {
+    "many-mappings": {"flows": 150, "phones": 10000}
+}
+
+
+# Runs one script in this process.  Called in the child process started by run_script.
+def run_child(run):
+    instances = synthetic_connect.create_instances(run["shape"])
+    recorder = synthetic_connect.install(instances, run["latency"] / 1000)
+    os.environ["AWS_DEFAULT_REGION"] = synthetic_connect.REGION
+
+    sys.path[0] = run["workdir"]
+    sys.path.insert(1, REPOSITORY)
+    sys.argv = [run["script"]] + run["arguments"]
+    start = time.perf_counter()
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        runpy.run_path(run["script"], run_name="__main__")
+    seconds = time.perf_counter() - start
+
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    peak_rss_mb = peak_rss / (1024 * 1024) if sys.platform == "darwin" else peak_rss / 1024
+
+    with open(run["result"], "w") as file:
+        json.dump({
+            "seconds": seconds,
+            "peak_rss_mb": peak_rss_mb,
+            "api_calls": dict(sorted(recorder.calls.items()))
+        }, file)
+
+
+# Runs a script in a child process and returns the measurements of the run
+def run_script(script, arguments, workdir, config, benchmark_args, shape):
+    for pattern in script["outputs"](config):
+        for path in glob.glob(os.path.join(workdir, pattern)):
+            os.remove(path)
+
+    result_path = os.path.join(workdir, "result.json")
+    run = {
+        "script": os.path.join(REPOSITORY, script["name"]),
+        "arguments": arguments,
+        "workdir": workdir,
+        "shape": shape,
+        "latency": benchmark_args.latency,
+        "result": result_path
+    }
+    subprocess.run([sys.executable, os.path.abspath(__file__), "--child", json.dumps(run)], check=True)
+    with open(result_path, "r") as file:
+        result = json.load(file)
+    os.remove(result_path)
+
+    result["output_bytes"] = sum(os.path.getsize(path)
+                                 for pattern in script["outputs"](config)
+                                 for path in glob.glob(os.path.join(workdir, pattern)))
+    return result
+
+
+def get_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPOSITORY, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_results(results):
+    print(f"{'Script':<34}{'Median s':>10}{'Min s':>10}{'API calls':>11}{'Peak MB':>10}{'Output KB':>11}")
+    for result in results:
+        runs = result["runs"]
+        print(f"{result['script']:<34}"
+              f"{result['median_seconds']:>10.3f}"
+              f"{min(run['seconds'] for run in runs):>10.3f}"
+              f"{sum(runs[0]['api_calls'].values()):>11}"
+              f"{max(run['peak_rss_mb'] for run in runs):>10.1f}"
+              f"{runs[0]['output_bytes'] / 1024:>11.1f}")
+
+
+def run_benchmarks(benchmark_args):
+    shape = {key: getattr(benchmark_args, key) for key in synthetic_connect.DEFAULT_SHAPE}
+    instances = synthetic_connect.create_instances(shape)
+    config = synthetic_connect.create_config(instances)
+
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        with open(os.path.join(workdir, "config.json"), "w") as file:
+            json.dump(config, file, indent=4)
+
+        # The template script reads the manifest written by the manifest script, so the scripts run in order
+        for script in SCRIPTS:
+            arguments = shlex.split(getattr(benchmark_args, script["arguments"]))
+            runs = [run_script(script, arguments, workdir, config, benchmark_args, shape)
+                    for _ in range(benchmark_args.repeat)]
+            results.append({
+                "script": script["name"],
+                "arguments": arguments,
+                "median_seconds": statistics.median(run["seconds"] for run in runs),
+                "runs": runs
+            })
+
+    report = {
+        "commit": get_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "shape": shape,
+        "latency_ms": benchmark_args.latency,
+        "repeat": benchmark_args.repeat,
+        "results": results
+    }
+    with open(benchmark_args.output, "w") as file:
+        json.dump(report, file, indent=4)
+    print_results(results)
+    print(f"Results written to {benchmark_args.output}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 3 and sys.argv[1] == "--child":
+        run_child(json.loads(sys.argv[2]))
+        sys.exit(0)
+
+    parser = argparse.ArgumentParser(description="Benchmarks the migration scripts against a synthetic Connect instance")
+    # The shape arguments default to None so a case can tell them apart from an argument given on the command line
+    for key, value in synthetic_connect.DEFAULT_SHAPE.items():
+        parser.add_argument(f"--{key}", type=type(value), help=f"(default: {value})")
+    parser.add_argument("--case", choices=sorted(CASES),
+                        help="start from the shape of one of the cases instead of the default shape")
+    parser.add_argument("--latency", type=float, default=0,
+                        help="simulated latency of every API call in milliseconds (default: 0)")
+    parser.add_argument("--repeat", type=int, default=3, help="number of runs of each script (default: 3)")
+    parser.add_argument("--manifest-args", default="",
+                        help="arguments for create-source-manifest-file.py")
+    parser.add_argument("--template-args", default="",
+                        help="arguments for create-contact-flow-template.py")
+    parser.add_argument("--output", default="benchmark-results.json",
+                        help="the JSON file the results are written to (default: benchmark-results.json)")
+    benchmark_args = parser.parse_args()
+    case = CASES[benchmark_args.case] if benchmark_args.case is not None else {}
+    for key, value in synthetic_connect.DEFAULT_SHAPE.items():
+        if getattr(benchmark_args, key) is None:
+            setattr(benchmark_args, key, case.get(key, value))
+    run_benchmarks(benchmark_args)
@@ -0,0 +1,493 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import json
+import random
+import threading
+import time
+import uuid
+from collections import Counter
+from types import SimpleNamespace
+from botocore.awsrequest import AWSResponse
+from botocore.exceptions import ClientError
+from botocore.hooks import HierarchicalEmitter
+
+# A local stand-in for the Connect, Lex V2 and STS clients used by the migration scripts.  It serves a
+# synthetic source instance and a destination instance with the same resource names, so both scripts can be
+# benchmarked without an AWS account.
+
+ACCOUNT = "111122223333"
+REGION = "us-east-1"
+SOURCE_INSTANCE_ID = "00000000-0000-4000-8000-000000000001"
+DESTINATION_INSTANCE_ID = "00000000-0000-4000-8000-000000000002"
+
+# The name filter used for the exported resources.  Two out of three flows match it.
+RESOURCE_PREFIX = "benchmark"
+
+# The default shape of a synthetic instance
+#   flows      - contact flows, every eleventh one is not published
+#   modules    - contact flow modules
+#   hours      - hours of operation
+#   actions    - actions per flow and module
+#   density    - the fraction of actions that reference another flow, module, hours of operation, Lambda function
+#                or Lex bot.  The remaining actions play prompts, set queues, transfer to phone numbers or play text
+#   bots       - Lex V2 bots, each with two aliases
+#   phones     - phone numbers, half of them are mapped to a destination phone number
+#   prompts    - audio prompts
+#   queues     - queues
+#   lambdas    - Lambda functions
+#   copies     - the number of consecutive flows, and of consecutive modules, that share the same content, e.g. the
+#                copies of a flow for each brand
+#   seed       - the random seed, the same seed always generates the same instance
+DEFAULT_SHAPE = {
+    "flows": 100,
+    "modules": 20,
+    "hours": 10,
+    "actions": 20,
+    "density": 0.3,
+    "bots": 5,
+    "phones": 50,
+    "prompts": 20,
+    "queues": 10,
+    "lambdas": 10,
+    "copies": 1,
+    "seed": 1
+}
+
+
+def random_id(rng):
+    return str(uuid.UUID(int=rng.getrandbits(128), version=4))
+
+
+def random_lex_id(rng):
+    return "".join(rng.choice("ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789") for _ in range(10))
+
+
+class SyntheticInstance:
+
+    def __init__(self, shape, instance_id, seed):
+        rng = random.Random(seed)
+        self.instance_id = instance_id
+        self.arn = f"arn:aws:connect:{REGION}:{ACCOUNT}:instance/{instance_id}"
+        self.phones = [f"+1555{1000000 + index:07d}" for index in range(shape["phones"])]
+        self.prompts = {f"Prompt{index}.wav": random_id(rng) for index in range(shape["prompts"])}
+        self.queues = {f"Queue{index}": random_id(rng) for index in range(shape["queues"])}
+        self.lambdas = [f"arn:aws:lambda:{REGION}:{ACCOUNT}:function:Benchmark{index}" for index in range(shape["lambdas"])]
+        self.bots = {}
+        for index in range(shape["bots"]):
+            self.bots[random_lex_id(rng)] = {
+                "botName": f"BenchmarkBot{index}",
+                "aliases": {random_lex_id(rng): "prod", random_lex_id(rng): "dev"}
+            }
+        self.hours = [{"Id": random_id(rng), "Name": f"{RESOURCE_PREFIX} Hours {index}"} for index in range(shape["hours"])]
+        self.modules = [{"Id": random_id(rng), "Name": f"{RESOURCE_PREFIX} Module {index}"} for index in range(shape["modules"])]
+        self.flows = [{
+            "Id": random_id(rng),
+            "Name": f"{RESOURCE_PREFIX} Flow {index}" if index % 3 != 2 else f"Unrelated Flow {index}",
+            "Type": "CONTACT_FLOW",
+            "Published": index % 11 != 10
+        } for index in range(shape["flows"])]
+
+        # The content is generated from its own seed so the source and destination instances only differ in their ids
+        content_rng = random.Random(shape["seed"])
+        exported_flows = list(filter(lambda flow: RESOURCE_PREFIX in flow["Name"] and flow["Published"], self.flows))
+        self.content = {}
+        for index, flow in enumerate(self.flows):
+            self.content[flow["Id"]] = self.generate_content(content_rng, shape, exported_flows, False) \
+                if index % shape["copies"] == 0 else self.content[self.flows[index - 1]["Id"]]
+        for index, module in enumerate(self.modules):
+            self.content[module["Id"]] = self.generate_content(content_rng, shape, [], True) \
+                if index % shape["copies"] == 0 else self.content[self.modules[index - 1]["Id"]]
+
+    def resource_arn(self, resource_type, resource_id):
+        return f"{self.arn}/{resource_type}/{resource_id}"
+
+    # Generates the content of a flow or module with the actions the exporter rewrites
+    def generate_content(self, rng, shape, flows, module):
+        actions = []
+        action_metadata = {}
+        for index in range(shape["actions"]):
+            identifier = random_id(rng)
+            metadata = {"position": {"x": 200 * index, "y": 100}}
+            if rng.random() < shape["density"]:
+                kind = rng.choice(["flow", "hook", "module", "hours", "lambda", "lex"])
+            else:
+                kind = rng.choice(["prompt", "queue", "phone", "text"])
+
+            if kind == "flow" and flows:
+                action = {"Type": "TransferToFlow", "Parameters": {
+                    "ContactFlowId": self.resource_arn("contact-flow", rng.choice(flows)["Id"])}}
+            elif kind == "hook" and flows:
+                action = {"Type": "UpdateContactEventHooks", "Parameters": {"EventHooks": {
+                    "CustomerQueue": self.resource_arn("contact-flow", rng.choice(flows)["Id"])}}}
+            elif kind == "module" and not module and self.modules:
+                target = rng.choice(self.modules)
+                action = {"Type": "InvokeFlowModule", "Parameters": {"FlowModuleId": target["Id"]}}
+                metadata["contactFlowModuleName"] = target["Name"]
+            elif kind == "hours" and self.hours:
+                action = {"Type": "CheckHoursOfOperation", "Parameters": {
+                    "Hours": self.resource_arn("operating-hours", rng.choice(self.hours)["Id"])}}
+            elif kind == "lambda" and self.lambdas:
+                action = {"Type": "InvokeLambdaFunction", "Parameters": {
+                    "LambdaFunctionARN": rng.choice(self.lambdas), "InvocationTimeLimitSeconds": "3"}}
+            elif kind == "lex" and self.bots:
+                bot_id = rng.choice(sorted(self.bots))
+                alias_id = rng.choice(sorted(self.bots[bot_id]["aliases"]))
+                action = {"Type": "ConnectParticipantWithLexBot", "Parameters": {
+                    "Text": "How can I help?",
+                    "LexV2Bot": {"AliasArn": f"arn:aws:lex:{REGION}:{ACCOUNT}:bot-alias/{bot_id}/{alias_id}"}}}
+            elif kind == "prompt" and self.prompts:
+                name = rng.choice(sorted(self.prompts))
+                prompt_arn = self.resource_arn("prompt", self.prompts[name])
+                action = {"Type": "MessageParticipant", "Parameters": {"PromptId": prompt_arn}}
+                metadata["audio"] = [{"id": prompt_arn, "text": name, "type": "Prompt"}]
+            elif kind == "queue" and self.queues:
+                name = rng.choice(sorted(self.queues))
+                queue_arn = self.resource_arn("queue", self.queues[name])
+                action = {"Type": "UpdateContactTargetQueue", "Parameters": {"QueueId": queue_arn}}
+                metadata["queue"] = {"id": queue_arn, "text": name}
+            elif kind == "phone" and self.phones:
+                action = {"Type": "TransferParticipantToThirdParty", "Parameters": {
+                    "ThirdPartyPhoneNumber": rng.choice(self.phones)}}
+            else:
+                action = {"Type": "MessageParticipant", "Parameters": {"Text": "Thank you for calling."}}
+            action["Identifier"] = identifier
+            action["Transitions"] = {}
+            actions.append(action)
+            action_metadata[identifier] = metadata
+
+        actions.append({
+            "Identifier": random_id(rng),
+            "Type": "EndFlowModuleExecution" if module else "DisconnectParticipant",
+            "Parameters": {},
+            "Transitions": {}
+        })
+        return json.dumps({
+            "Version": "2019-10-30",
+            "StartAction": actions[0]["Identifier"],
+            "Metadata": {"entryPointPosition": {"x": 15, "y": 15}, "ActionMetadata": action_metadata},
+            "Actions": actions
+        }, separators=(",", ":"))
+
+
+# Records the number of calls per operation and adds the simulated latency to every call
+class CallRecorder:
+
+    def __init__(self, latency):
+        self.latency = latency
+        self.calls = Counter()
+        self.lock = threading.Lock()
+
+    def record(self, operation):
+        with self.lock:
+            self.calls[operation] += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+
+# Emits the botocore client events around every call, like a boto3 client, so instrumented clients work
+# with the stand-in:
+#   before-parameter-build - with the parameters of the call and the model of the operation
+#   before-call            - a handler that returns a response replaces the call, as when a snapshot is replayed
+#   before-send            - only when the call is made
+#   after-call             - with an HTTP response that has the status code of the call
+class SyntheticClient:
+
+    def __init__(self, service_id, service_name, recorder):
+        self.service_id = service_id
+        self.service_name = service_name
+        self.recorder = recorder
+        self.meta = SimpleNamespace(events=HierarchicalEmitter())
+
+    def call(self, operation, params, handler):
+        operation_name = "".join(map(str.capitalize, operation.split("_")))
+        event_name = f"{self.service_id}.{operation_name}"
+        model = SimpleNamespace(name=operation_name, service_model=SimpleNamespace(service_name=self.service_name))
+        context = {}
+        self.meta.events.emit(f"before-parameter-build.{event_name}", params=params, model=model, context=context)
+        handler_response, response = self.meta.events.emit_until_response(
+            f"before-call.{event_name}", params=params, model=model, context=context)
+        if response is not None:
+            http_response, parsed = response
+        else:
+            self.meta.events.emit(f"before-send.{event_name}", request=None)
+            self.recorder.record(operation)
+            try:
+                parsed = handler()
+                http_response = AWSResponse(None, 200, {}, None)
+            except ClientError as error:
+                parsed = error.response
+                http_response = AWSResponse(None, 400, {}, None)
+            parsed["ResponseMetadata"] = {"HTTPStatusCode": http_response.status_code, "RetryAttempts": 0}
+        self.meta.events.emit(f"after-call.{event_name}", http_response=http_response, parsed=parsed, model=model,
+                              context=context)
+        if http_response.status_code >= 300:
+            code = parsed["Error"]["Code"]
+            raise getattr(getattr(self, "exceptions", None), code, ClientError)(parsed, operation_name)
+        return parsed
+
+
+class SyntheticPaginator:
+
+    def __init__(self, client, operation):
+        self.client = client
+        self.operation = operation
+
+    def paginate(self, **kwargs):
+        pagination_config = kwargs.pop("PaginationConfig", {})
+        summaries, key = self.client.list_summaries(self.operation, kwargs["InstanceId"], kwargs.get("SearchCriteria"))
+        if "MaxItems" in pagination_config:
+            summaries = summaries[:pagination_config["MaxItems"]]
+        page_size = pagination_config.get("PageSize", 100)
+        for index in range(0, max(len(summaries), 1), page_size):
+            # The parameters boto3 would send, so a recorded snapshot has the keys of a real run
+            params = dict(kwargs)
+            if "PageSize" in pagination_config:
+                params["MaxResults"] = page_size
+            if index > 0:
+                params["NextToken"] = str(index)
+            yield self.client.call(self.operation, params, lambda: {key: summaries[index:index + page_size]})
+
+
+class SyntheticConnectClient(SyntheticClient):
+
+    def __init__(self, instances, recorder):
+        super().__init__("connect", "connect", recorder)
+        self.instances = {instance.instance_id: instance for instance in instances}
+
+        class Exceptions:
+            ContactFlowNotPublishedException = type("ContactFlowNotPublishedException", (ClientError,), {})
+            ResourceNotFoundException = type("ResourceNotFoundException", (ClientError,), {})
+        self.exceptions = Exceptions
+
+    def get_paginator(self, operation):
+        return SyntheticPaginator(self, operation)
+
+    def can_paginate(self, operation):
+        return operation.startswith("list_") or operation.startswith("search_")
+
+    def list_summaries(self, operation, instance_id, search_criteria=None):
+        instance = self.instances[instance_id]
+        if operation.startswith("search_"):
+            return self.search(instance, operation, search_criteria)
+        if operation == "list_contact_flows":
+            return [{"Id": flow["Id"], "Arn": instance.resource_arn("contact-flow", flow["Id"]), "Name": flow["Name"],
+                     "ContactFlowType": flow["Type"]} for flow in instance.flows], "ContactFlowSummaryList"
+        if operation == "list_contact_flow_modules":
+            return [{"Id": module["Id"], "Arn": instance.resource_arn("flow-module", module["Id"]), "Name": module["Name"]}
+                    for module in instance.modules], "ContactFlowModulesSummaryList"
+        if operation == "list_hours_of_operations":
+            return [{"Id": hours["Id"], "Arn": instance.resource_arn("operating-hours", hours["Id"]), "Name": hours["Name"]}
+                    for hours in instance.hours], "HoursOfOperationSummaryList"
+        if operation == "list_phone_numbers":
+            return [{"Id": phone, "Arn": instance.resource_arn("phone-number", phone), "PhoneNumber": phone}
+                    for phone in instance.phones], "PhoneNumberSummaryList"
+        if operation == "list_prompts":
+            return [{"Id": prompt_id, "Arn": instance.resource_arn("prompt", prompt_id), "Name": name}
+                    for name, prompt_id in instance.prompts.items()], "PromptSummaryList"
+        if operation == "list_queues":
+            return [{"Id": queue_id, "Arn": instance.resource_arn("queue", queue_id), "Name": name}
+                    for name, queue_id in instance.queues.items()], "QueueSummaryList"
+        if operation == "list_quick_connects":
+            return [], "QuickConnectSummaryList"
+        if operation == "list_routing_profiles":
+            return [], "RoutingProfileSummaryList"
+        raise Exception(f"The synthetic Connect client does not support {operation}")
+
+    # Supports the name conditions the exporter sends: a StringCondition or OrConditions of StringConditions.
+    # CONTAINS matches regardless of case.
+    def search(self, instance, operation, search_criteria):
+        conditions = search_criteria["OrConditions"] if "OrConditions" in search_criteria else [search_criteria]
+        values = list(map(lambda condition: condition["StringCondition"]["Value"].lower(), conditions))
+
+        def matches(name):
+            return any(value in name.lower() for value in values)
+
+        if operation == "search_contact_flows":
+            return [self.flow_properties(instance, flow) for flow in instance.flows if matches(flow["Name"])], \
+                "ContactFlows"
+        if operation == "search_contact_flow_modules":
+            return [self.module_properties(instance, module) for module in instance.modules if matches(module["Name"])], \
+                "ContactFlowModules"
+        if operation == "search_hours_of_operations":
+            return [self.hours_properties(instance, hours) for hours in instance.hours if matches(hours["Name"])], \
+                "HoursOfOperations"
+        raise Exception(f"The synthetic Connect client does not support {operation}")
+
+    def describe_instance(self, InstanceId):
+        return self.call("describe_instance", {"InstanceId": InstanceId},
+                         lambda: {"Instance": {"Id": InstanceId, "Arn": self.instances[InstanceId].arn}})
+
+    def describe_contact_flow(self, InstanceId, ContactFlowId):
+        return self.call("describe_contact_flow", {"InstanceId": InstanceId, "ContactFlowId": ContactFlowId},
+                         lambda: self.contact_flow(InstanceId, ContactFlowId))
+
+    def describe_contact_flow_module(self, InstanceId, ContactFlowModuleId):
+        return self.call("describe_contact_flow_module",
+                         {"InstanceId": InstanceId, "ContactFlowModuleId": ContactFlowModuleId},
+                         lambda: self.contact_flow_module(InstanceId, ContactFlowModuleId))
+
+    def describe_hours_of_operation(self, InstanceId, HoursOfOperationId):
+        return self.call("describe_hours_of_operation",
+                         {"InstanceId": InstanceId, "HoursOfOperationId": HoursOfOperationId},
+                         lambda: self.hours_of_operation(InstanceId, HoursOfOperationId))
+
+    def contact_flow(self, InstanceId, ContactFlowId):
+        instance = self.instances[InstanceId]
+        flow = next(filter(lambda flow: flow["Id"] == ContactFlowId, instance.flows))
+        if not flow["Published"]:
+            raise self.exceptions.ContactFlowNotPublishedException(
+                {"Error": {"Code": "ContactFlowNotPublishedException", "Message": "The flow is not published"}},
+                "DescribeContactFlow")
+        return {"ContactFlow": self.flow_properties(instance, flow)}
+
+    def contact_flow_module(self, InstanceId, ContactFlowModuleId):
+        instance = self.instances[InstanceId]
+        module = next(filter(lambda module: module["Id"] == ContactFlowModuleId, instance.modules))
+        return {"ContactFlowModule": self.module_properties(instance, module)}
+
+    def hours_of_operation(self, InstanceId, HoursOfOperationId):
+        instance = self.instances[InstanceId]
+        hours = next(filter(lambda hours: hours["Id"] == HoursOfOperationId, instance.hours))
+        return {"HoursOfOperation": self.hours_properties(instance, hours)}
+
+    # The search APIs return the same shape as the describe APIs, the search also finds the unpublished flows
+    @staticmethod
+    def flow_properties(instance, flow):
+        return {
+            "Arn": instance.resource_arn("contact-flow", flow["Id"]),
+            "Id": flow["Id"],
+            "Name": flow["Name"],
+            "Type": flow["Type"],
+            "State": "ACTIVE",
+            "Status": "PUBLISHED" if flow["Published"] else "SAVED",
+            "Description": "Synthetic contact flow",
+            "Content": instance.content[flow["Id"]],
+            "Tags": {}
+        }
+
+    @staticmethod
+    def module_properties(instance, module):
+        return {
+            "Arn": instance.resource_arn("flow-module", module["Id"]),
+            "Id": module["Id"],
+            "Name": module["Name"],
+            "Content": instance.content[module["Id"]],
+            "Description": "Synthetic contact flow module",
+            "State": "ACTIVE",
+            "Status": "PUBLISHED",
+            "Tags": {}
+        }
+
+    @staticmethod
+    def hours_properties(instance, hours):
+        return {
+            "HoursOfOperationId": hours["Id"],
+            "HoursOfOperationArn": instance.resource_arn("operating-hours", hours["Id"]),
+            "Name": hours["Name"],
+            "Description": "Synthetic hours of operation",
+            "TimeZone": "America/New_York",
+            "Config": [{"Day": "MONDAY", "StartTime": {"Hours": 9, "Minutes": 0}, "EndTime": {"Hours": 17, "Minutes": 0}}],
+            "Tags": {}
+        }
+
+def page_params(params, next_token):
+    return dict(params, nextToken=next_token) if next_token is not None else params
+
+
+class SyntheticLexClient(SyntheticClient):
+
+    def __init__(self, instances, recorder):
+        super().__init__("lex-models-v2", "lexv2-models", recorder)
+        self.bots = {}
+        for instance in instances:
+            self.bots.update(instance.bots)
+
+    def describe_bot(self, botId):
+        return self.call("describe_bot", {"botId": botId},
+                         lambda: {"botId": botId, "botName": self.bots[botId]["botName"]})
+
+    def describe_bot_alias(self, botAliasId, botId):
+        return self.call("describe_bot_alias", {"botAliasId": botAliasId, "botId": botId}, lambda: {
+            "botAliasId": botAliasId,
+            "botAliasName": self.bots[botId]["aliases"][botAliasId],
+            "botId": botId
+        })
+
+    # Like boto3, the first page is requested without a nextToken, so the recorded calls match those of real clients
+    def list_bots(self, maxResults=10, nextToken=None):
+        params = page_params({"maxResults": maxResults}, nextToken)
+        return self.call("list_bots", params, lambda: self.page(
+            "botSummaries", [{"botId": bot_id, "botName": bot["botName"]} for bot_id, bot in self.bots.items()],
+            maxResults, nextToken))
+
+    def list_bot_aliases(self, botId, maxResults=10, nextToken=None):
+        params = page_params({"botId": botId, "maxResults": maxResults}, nextToken)
+        return self.call("list_bot_aliases", params, lambda: self.page(
+            "botAliasSummaries", [{"botAliasId": alias_id, "botAliasName": alias_name}
+                                  for alias_id, alias_name in self.bots[botId]["aliases"].items()],
+            maxResults, nextToken))
+
+    def page(self, key, summaries, max_results, next_token):
+        start = int(next_token) if next_token is not None else 0
+        response = {key: summaries[start:start + max_results]}
+        if start + max_results < len(summaries):
+            response["nextToken"] = str(start + max_results)
+        return response
+
+
+class SyntheticStsClient(SyntheticClient):
+
+    def __init__(self, recorder):
+        super().__init__("sts", "sts", recorder)
+
+    def get_caller_identity(self):
+        return self.call("get_caller_identity", {}, lambda: {
+            "Account": ACCOUNT,
+            "Arn": f"arn:aws:iam::{ACCOUNT}:user/benchmark",
+            "UserId": "BENCHMARK"
+        })
+
+
+# Creates the source and destination instances for a shape
+def create_instances(shape):
+    return [SyntheticInstance(shape, SOURCE_INSTANCE_ID, shape["seed"]),
+            SyntheticInstance(shape, DESTINATION_INSTANCE_ID, shape["seed"] + 1)]
+
+
+# Replaces boto3.client and the client method of boto3 sessions with the stand-in and returns the recorder
+# with the call counts
+def install(instances, latency=0):
+    import boto3
+    recorder = CallRecorder(latency)
+
+    def client(service_name, *args, **kwargs):
+        if service_name == "connect":
+            return SyntheticConnectClient(instances, recorder)
+        if service_name == "lexv2-models":
+            return SyntheticLexClient(instances, recorder)
+        if service_name == "sts":
+            return SyntheticStsClient(recorder)
+        raise Exception(f"The synthetic clients do not support {service_name}")
+
+    boto3.client = client
+    boto3.session.Session.client = lambda session, service_name, *args, **kwargs: client(service_name)
+    return recorder
+
+
+# The config.json used by both scripts
+def create_config(instances):
+    source, destination = instances
+    return {
+        "Input": {
+            "ConnectInstanceId": source.instance_id,
+            "PhoneNumberMappings": {phone: phone.replace("+1555", "+1666") for phone in source.phones[::2]}
+        },
+        "ResourceFilters": {"ContactFlows": [RESOURCE_PREFIX]},
+        "Output": {
+            "ConnectInstanceId": destination.instance_id,
+            "ManifestFileName": "manifest.json",
+            "Filename": "contact-flows.json",
+            "TemplateDescription": "Benchmark contact flows"
+        }
+    }
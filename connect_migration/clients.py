@@ -0,0 +1,128 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import os
+import threading
+import boto3
+from botocore import UNSIGNED
+from botocore.config import Config
+from connect_migration.rate_limiter import RateLimiter
+from connect_migration.snapshot import REPLAY
+from connect_migration.telemetry import Telemetry
+
+# The boto3 clients used by the library.  Every client is created from one boto3 session, so the credentials are
+# resolved once, and there is one client per service and region.  A client is created the first time it is needed
+# and is kept for the lifetime of the process, so repeated exports in the same process, e.g. warm Lambda invocations,
+# reuse the clients and their open connections.
+#
+# Every client shares the rate limiter and the telemetry, and the snapshot when the calls are recorded or replayed.
+telemetry = Telemetry()
+rate_limiter = RateLimiter()
+snapshot = None
+
+# The retry and timeout settings of the clients.  They can be changed in the Clients section of config.json.
+#   RetryMode      - the botocore retry mode, standard retries throttling errors with exponential backoff.
+#                    adaptive is not recommended, it adds a second client side rate limiter
+#   MaxAttempts    - the number of attempts of a call, including the first one
+#   ConnectTimeout - seconds to wait for a connection
+#   ReadTimeout    - seconds to wait for a response
+DEFAULT_CLIENT_SETTINGS = {
+    "RetryMode": "standard",
+    "MaxAttempts": 8,
+    "ConnectTimeout": 10,
+    "ReadTimeout": 30
+}
+
+# The botocore default connection pool size
+MIN_POOL_CONNECTIONS = 10
+
+client_settings = dict(DEFAULT_CLIENT_SETTINGS)
+session = None
+
+# (service name, region) -> (connection pool size, client)
+clients = {}
+lock = threading.RLock()
+
+
+def get_session():
+    global session
+    with lock:
+        if session is None:
+            session = boto3.session.Session()
+        return session
+
+
+def get_current_region():
+    # The replayed responses are from the region they were recorded in
+    if snapshot is not None and snapshot.region is not None:
+        return snapshot.region
+    easy_checks = [
+        # check if set through ENV vars
+        os.environ.get('AWS_REGION'),
+        os.environ.get('AWS_DEFAULT_REGION'),
+        boto3.DEFAULT_SESSION.region_name if boto3.DEFAULT_SESSION else None,
+        get_session().region_name,
+    ]
+    for region in easy_checks:
+        if region:
+            return region
+
+
+# Applies the RateLimits and Clients sections of config.json and the command line options to the shared rate
+# limiter, telemetry and clients.  The clients are created again when the client settings or the snapshot change.
+#
+# The rate limiter is opt-in.  rate_limit True or False turns it on or off, None turns it on only when config.json
+# has a RateLimits section.
+def configure(config, rate_limit=None, telemetry_live=False, api_snapshot=None):
+    global client_settings, snapshot
+    rate_limiter.configure(config["RateLimits"] if "RateLimits" in config else {})
+    rate_limiter.enabled = rate_limit if rate_limit is not None else "RateLimits" in config
+    telemetry.live = telemetry_live
+
+    settings = dict(DEFAULT_CLIENT_SETTINGS)
+    settings.update(config["Clients"] if "Clients" in config else {})
+    with lock:
+        if settings != client_settings or api_snapshot is not snapshot:
+            client_settings = settings
+            snapshot = api_snapshot
+            clients.clear()
+
+
+def instrument(client):
+    rate_limiter.instrument(client)
+    telemetry.instrument(client)
+    if snapshot is not None:
+        snapshot.instrument(client)
+    return client
+
+
+# TCP keep-alive stops idle connections from being dropped while the other calls of an export run.  The replayed
+# calls are never sent, so they are not signed and do not need credentials.
+def create_client(service_name, region_name, max_pool_connections):
+    settings = {}
+    if snapshot is not None and snapshot.mode == REPLAY:
+        settings["signature_version"] = UNSIGNED
+    return instrument(get_session().client(service_name,
+                                           region_name=region_name,
+                                           config=Config(max_pool_connections=max_pool_connections,
+                                                         tcp_keepalive=True,
+                                                         connect_timeout=client_settings["ConnectTimeout"],
+                                                         read_timeout=client_settings["ReadTimeout"],
+                                                         retries={
+                                                             "mode": client_settings["RetryMode"],
+                                                             "total_max_attempts": client_settings["MaxAttempts"]
+                                                         },
+                                                         **settings)))
+
+
+# Returns the client for a service and region, the current region by default.  Each worker thread needs its own
+# connection when the calls are run in parallel, so the connection pool has at least one connection for every
+# concurrent call.  The client is created again with a larger pool when a later export runs more calls at once.
+def get_client(service_name, region_name=None, concurrency=1):
+    region_name = region_name or get_current_region()
+    max_pool_connections = max(MIN_POOL_CONNECTIONS, concurrency)
+    key = (service_name, region_name)
+    with lock:
+        if key not in clients or clients[key][0] < max_pool_connections:
+            clients[key] = (max_pool_connections, create_client(service_name, region_name, max_pool_connections))
+        return clients[key][1]
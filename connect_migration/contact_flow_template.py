@@ -0,0 +1,2321 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+# Known Issues:
+#   Contact flows and modules can not have an apostrophe -- ie GetUserInput and PlayPrompt.
+#   describe_contact_flow and describe_contact_flow_module will error both in boto3 and from the CLI
+#
+#   Lex V2 references must be manually attached to the Connect instance
+
+import hashlib
+import re
+import os
+import json
+import multiprocessing
+import threading
+import time
+from botocore.exceptions import ClientError
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import lru_cache, reduce
+from connect_migration.clients import get_client, get_current_region
+from connect_migration.profiler import profiler
+from connect_migration.manifest_store import ManifestStore, is_store
+from connect_migration.source_manifest import read_manifest
+from connect_migration.task_graph import TaskGraph
+from connect_migration.template_validator import GUID, TemplateValidator, validate_template
+import pydash as _
+
+# Creates a CloudFormation template from the contact flows, modules and hours of operation in a Connect instance.
+# create-contact-flow-template.py runs export_template with the options of its command line.
+#
+# The state of an export, e.g. the template and the id -> resource name mappings, is kept in the module and set
+# again at the start of every export, so only one export runs at a time in a process.  The clients, the account
+# of the source instance and the manifest files are kept between exports.
+
+# The content of config.json
+config = None
+
+# The directory config.json refers to.  The manifest files, the describe cache and the templates are relative to it.
+directory = os.getcwd()
+
+# Number of describe calls to run in parallel
+concurrency = 1
+
+describe_cache = None
+
+# The output options of the current export
+nested_stacks = 0
+write = True
+delta = False
+validate = True
+
+# Held while the source instance is looked up for the references of a content, see get_lexbot_details()
+source_lock = threading.Lock()
+
+
+# Matches resource names against every name in ResourceFilters.ContactFlows in a single pass.
+# A resource is selected when its name contains any of the filter names.  The filter names are compiled
+# into an Aho-Corasick automaton so the cost of matching a resource name does not grow with the number
+# of filters.
+class ResourceFilter:
+    def __init__(self, names):
+        self.names = list(names)
+        # goto[state] maps the next character to the next state, matched[state] is True when a filter
+        # name ends at the state or at any state reachable through its failure links
+        self.goto = [{}]
+        self.fail = [0]
+        self.matched = [False]
+        for name in names:
+            state = 0
+            for char in name:
+                if char not in self.goto[state]:
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.matched.append(False)
+                    self.goto[state][char] = len(self.goto) - 1
+                state = self.goto[state][char]
+            self.matched[state] = True
+
+        # Build the failure links breadth first.  States directly below the root fail back to the root.
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self.goto[state].items():
+                queue.append(next_state)
+                fail = self.fail[state]
+                while fail and char not in self.goto[fail]:
+                    fail = self.fail[fail]
+                self.fail[next_state] = self.goto[fail].get(char, 0)
+                self.matched[next_state] = self.matched[next_state] or self.matched[self.fail[next_state]]
+
+    def matches(self, name):
+        # an empty filter name matches every resource
+        if self.matched[0]:
+            return True
+        state = 0
+        for char in name:
+            while state and char not in self.goto[state]:
+                state = self.fail[state]
+            state = self.goto[state].get(char, 0)
+            if self.matched[state]:
+                return True
+        return False
+
+    # Returns the summaries whose name matches any filter.  Each summary is returned at most once
+    # no matter how many of the filter names it contains.
+    def select(self, summaries):
+        return list(filter(lambda summary: self.matches(summary["Name"]), summaries))
+
+
+# Lists every resource of a type in the source Connect instance
+def list_resources(operation, summary_list, **kwargs):
+    summaries = []
+    paginator = client.get_paginator(operation)
+    for page in paginator.paginate(InstanceId=config["Input"]["ConnectInstanceId"],
+                                   PaginationConfig={
+                                                     "PageSize": 50,
+                                    },
+                                   **kwargs):
+        summaries.extend(page[summary_list])
+    return summaries
+
+
+CONTACT_FLOW_TYPES = ['CONTACT_FLOW',
+                      'CUSTOMER_QUEUE',
+                      'CUSTOMER_HOLD',
+                      'CUSTOMER_WHISPER',
+                      'AGENT_HOLD',
+                      'AGENT_WHISPER',
+                      'OUTBOUND_WHISPER',
+                      'AGENT_TRANSFER',
+                      'QUEUE_TRANSFER']
+
+# The resource types in the inventory.
+#   list      - the list API and its arguments, returns every resource of the type
+#   search    - the search API that accepts name conditions
+#   results   - the key of the search results
+#   summary   - converts a search result to the summary returned by the list API, or None to skip the result.
+#               The modification time and content hash of the result are kept so the describe cache sees the
+#               resources that changed.
+#   properties - returns the describe response of a search result, or None when the result does not have the
+#                properties of the describe response and the resource is described instead.  The search APIs
+#                return the same structure as the describe APIs, so a found resource is not described again.
+SEARCHABLE_RESOURCE_TYPES = {
+    "ContactFlowSummaryList": {
+        "list": lambda: list_resources('list_contact_flows',
+                                       "ContactFlowSummaryList",
+                                       ContactFlowTypes=CONTACT_FLOW_TYPES),
+        "search": "search_contact_flows",
+        "results": "ContactFlows",
+        "summary": lambda result: {
+            "Id": result["Id"],
+            "Arn": result["Arn"],
+            "Name": result["Name"],
+            "ContactFlowType": result["Type"],
+            "ContactFlowState": result["State"],
+            "ContactFlowStatus": result["Status"],
+            **_.pick(result, "LastModifiedTime", "FlowContentSha256")
+        } if result["Type"] in CONTACT_FLOW_TYPES else None,
+        # A contact flow that is not published is described, describe_contact_flow reports that it is not exported
+        "properties": lambda result: result if "Content" in result and _.get(result, "Status") == "PUBLISHED" else None
+    },
+    "ContactFlowModulesSummaryList": {
+        "list": lambda: list_resources('list_contact_flow_modules',
+                                       "ContactFlowModulesSummaryList",
+                                       ContactFlowModuleState="active"),
+        "search": "search_contact_flow_modules",
+        "results": "ContactFlowModules",
+        "summary": lambda result: {
+            "Id": result["Id"],
+            "Arn": result["Arn"],
+            "Name": result["Name"],
+            "State": result["State"],
+            **_.pick(result, "LastModifiedTime", "FlowModuleContentSha256")
+        } if result["State"].upper() == "ACTIVE" else None,
+        "properties": lambda result: result if "Content" in result else None
+    },
+    "HoursOfOperationSummaryList": {
+        "list": lambda: list_resources('list_hours_of_operations',
+                                       "HoursOfOperationSummaryList"),
+        "search": "search_hours_of_operations",
+        "results": "HoursOfOperations",
+        "summary": lambda result: {
+            "Id": result["HoursOfOperationId"],
+            "Arn": result["HoursOfOperationArn"],
+            "Name": result["Name"],
+            **_.pick(result, "LastModifiedTime")
+        },
+        "properties": lambda result: result if "Config" in result and "TimeZone" in result else None
+    }
+}
+
+
+# Searches the source Connect instance for the resources whose name contains any of the filter names.
+# Returns None when the search API is not available, e.g. with an older boto3 or without permission to call it.
+#
+# With properties, the summary of a result that has the properties of the describe response keeps them in
+# Properties, so the resource is not described.  The streaming export does not keep them, so the contents of the
+# found resources are not all held in memory at once.
+def search_resources(resource_type, names, properties=True):
+    if not client.can_paginate(resource_type["search"]):
+        return None
+
+    conditions = list(map(lambda name: {
+        "StringCondition": {"FieldName": "name", "Value": name, "ComparisonType": "CONTAINS"}
+    }, names))
+    summaries = []
+    paginator = client.get_paginator(resource_type["search"])
+    try:
+        for page in paginator.paginate(InstanceId=config["Input"]["ConnectInstanceId"],
+                                       SearchCriteria=conditions[0] if len(conditions) == 1 else {"OrConditions": conditions},
+                                       PaginationConfig={
+                                                         "PageSize": 100,
+                                        }):
+            summaries.extend(page[resource_type["results"]])
+    except ClientError as error:
+        print(f"Warning: {resource_type['search']} failed, listing every resource instead. {error}")
+        return None
+    return list(filter(None, map(lambda result: search_summary(resource_type, result, properties), summaries)))
+
+
+def search_summary(resource_type, result, properties):
+    summary = resource_type["summary"](result)
+    if summary is not None and properties and resource_type["properties"](result) is not None:
+        summary["Properties"] = resource_type["properties"](result)
+    return summary
+
+
+# Wraps a describe function so the resources found by the search APIs are not described again
+def searched_properties(describe):
+    return lambda summary: summary["Properties"] if "Properties" in summary else describe(summary)
+
+
+# Lists the contact flows, modules and hours of operation in the source Connect instance once.
+# Every resource filter is matched against this inventory instead of listing the instance again per filter.
+#
+# The name filters are pushed down to the Connect search APIs, so only the resources whose name contains a
+# filter name are scanned.  The search does not have to match the case of the name, so the results are still
+# matched by the resource filter.  The list APIs are used when search is disabled with --no-search, when
+# a filter name is empty and matches every resource, or when the search API is not available.
+#
+# Only the modules that match the filter are known when they are searched, the name of any other referenced
+# module is looked up by get_source_module_name().
+#
+# The resource types are listed at the same time.
+@profiler.profiled("list")
+def list_inventory(resource_filter, search=True, properties=True):
+    print("Listing resources in the source Connect instance...")
+    graph = TaskGraph(len(SEARCHABLE_RESOURCE_TYPES))
+    for key in SEARCHABLE_RESOURCE_TYPES:
+        graph.add(key, lambda key=key: list_inventory_type(resource_filter, key, search, properties))
+    results = graph.run()
+    profiler.add_items(sum(map(lambda key: len(results[key][0]), SEARCHABLE_RESOURCE_TYPES)))
+
+    print_inventory(results)
+    return {key: results[key][0] for key in SEARCHABLE_RESOURCE_TYPES}
+
+
+# Returns the summaries of a resource type of the inventory and the API used to find them, search or list
+def list_inventory_type(resource_filter, key, search, properties=True):
+    resource_type = SEARCHABLE_RESOURCE_TYPES[key]
+    summaries = None
+    if search and all(resource_filter.names):
+        summaries = search_resources(resource_type, resource_filter.names, properties)
+    if summaries is not None:
+        return summaries, "search"
+    return resource_type["list"](), "list"
+
+
+def print_inventory(results):
+    print(f"{'Resource type':<32}{'Path':>8}{'Scanned':>10}")
+    for key in SEARCHABLE_RESOURCE_TYPES:
+        summaries, path = results[key]
+        print(f"{key:<32}{path:>8}{len(summaries):>10}")
+
+
+# The fields of a summary that change when the resource is edited
+CHANGE_SIGNALS = ["LastModifiedTime", "FlowContentSha256", "FlowModuleContentSha256"]
+
+
+# An opt-in on-disk cache of describe responses so a re-run only describes the resources that changed.
+#
+# Each entry is stored in <directory>/<instance id>/<resource id>.json along with a fingerprint of the
+# resource's summary, including its modification time and content hash (CHANGE_SIGNALS).  A cached response is
+# used when the summary has not changed since it was cached and the entry is younger than max_age.
+#
+# Not every list API returns a modification time in its summaries, e.g. with --no-search.  The fingerprint of such
+# a summary does not change when the resource is edited, so those resources are always described unless
+# without_changes is True, in which case max_age bounds how stale a cached response can be.  Use --refresh after
+# changing resources in the source instance to describe everything again.
+#
+# evict() removes the entries older than max_age and then the least recently used entries until the cache
+# is smaller than max_size.
+class DescribeCache:
+    def __init__(self, directory, instance_id, max_age, max_size, refresh=False, without_changes=False):
+        self.directory = directory
+        self.path = os.path.join(directory, instance_id)
+        self.max_age = max_age
+        self.max_size = max_size
+        self.refresh = refresh
+        self.without_changes = without_changes
+        self.hits = 0
+        self.misses = 0
+        self.bypassed = 0
+        os.makedirs(self.path, exist_ok=True)
+
+    # True when a change of the resource changes the fingerprint of its summary
+    @staticmethod
+    def has_changes(summary):
+        return any(map(lambda signal: signal in summary, CHANGE_SIGNALS))
+
+    @staticmethod
+    def fingerprint(summary):
+        return hashlib.sha256(json.dumps(summary, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+    def entry_path(self, summary):
+        return os.path.join(self.path, summary["Id"].split("/")[-1] + ".json")
+
+    def get(self, summary):
+        if self.refresh:
+            return None
+        try:
+            with open(self.entry_path(summary), "r") as file:
+                entry = json.load(file)
+        except (OSError, ValueError):
+            return None
+        if entry["Fingerprint"] != self.fingerprint(summary) or time.time() - entry["Cached"] > self.max_age:
+            return None
+        # Touch the entry so eviction removes the least recently used entries first
+        os.utime(self.entry_path(summary))
+        return entry["Properties"]
+
+    def put(self, summary, properties):
+        entry = {
+            "Fingerprint": self.fingerprint(summary),
+            "Cached": time.time(),
+            "Properties": properties
+        }
+        # write to a temporary file first so a concurrent or interrupted run never reads a partial entry
+        temporary_path = f"{self.entry_path(summary)}.{threading.get_ident()}.tmp"
+        with open(temporary_path, "w") as file:
+            json.dump(entry, file, default=str)
+        os.replace(temporary_path, self.entry_path(summary))
+
+    # Wraps a describe function so it is only called for resources without a valid cache entry.
+    # Resources that can not be exported (describe returns None) are not cached.
+    def cached(self, describe):
+        def describe_with_cache(summary):
+            if not self.without_changes and not self.has_changes(summary):
+                self.bypassed += 1
+                return describe(summary)
+
+            properties = self.get(summary)
+            if properties is not None:
+                self.hits += 1
+                return properties
+
+            self.misses += 1
+            properties = describe(summary)
+            if properties is not None:
+                self.put(summary, properties)
+            return properties
+        return describe_with_cache
+
+    def evict(self):
+        entries = []
+        for root, directories, files in os.walk(self.directory):
+            for name in files:
+                path = os.path.join(root, name)
+                status = os.stat(path)
+                entries.append((status.st_mtime, status.st_size, path))
+
+        # oldest entries first
+        entries.sort()
+        now = time.time()
+        total_size = sum(map(lambda entry: entry[1], entries))
+        evicted = 0
+        for modified, size, path in entries:
+            if now - modified <= self.max_age and total_size <= self.max_size:
+                break
+            os.remove(path)
+            total_size -= size
+            evicted += 1
+        print(f"Describe cache: {self.hits} hits, {self.misses} misses, {self.bypassed} without changes, "
+              f"{evicted} entries evicted")
+
+
+# Calls describe for each of the resource summaries returned by a list API.
+# When --concurrency is greater than 1 the calls are fanned out over a bounded pool of worker threads.
+# The results are always returned in the same order as the summaries so the resources are added to the
+# template in the same order as a serial run and the generated template is identical.
+@profiler.profiled("describe")
+def describe_resources(describe, summaries):
+    if describe_cache is not None:
+        describe = describe_cache.cached(describe)
+    profiler.add_items(len(summaries))
+
+    if concurrency <= 1 or len(summaries) <= 1:
+        return list(map(describe, summaries))
+
+    with ThreadPoolExecutor(max_workers=min(concurrency, len(summaries))) as executor:
+        return list(executor.map(describe, summaries))
+
+
+# Returns the properties of a published contact flow or None if the contact flow can not be exported
+def describe_contact_flow(contact_flow):
+    try:
+        print(f"Calling describe_contact flow for {contact_flow['Name']}")
+        return client.describe_contact_flow(
+            InstanceId=config["Input"]["ConnectInstanceId"],
+            ContactFlowId=contact_flow["Id"]
+        )["ContactFlow"]
+    except client.exceptions.ContactFlowNotPublishedException:
+        print(f"Warning: {contact_flow['Name']} is not published, Unable to export.")
+        return None
+
+
+def describe_contact_flow_module(contact_flow_module):
+    print(f"Calling describe_contact_flow_module for {contact_flow_module['Name']}")
+    return client.describe_contact_flow_module(
+        InstanceId=config["Input"]["ConnectInstanceId"],
+        ContactFlowModuleId=contact_flow_module["Id"].split("/")[-1]
+    )["ContactFlowModule"]
+
+
+def describe_hours_of_operation(hours_of_operation):
+    print(f"Calling describe_hours_of_operation for {hours_of_operation['Name']}")
+    return client.describe_hours_of_operation(
+        InstanceId=config["Input"]["ConnectInstanceId"],
+        HoursOfOperationId=hours_of_operation["Id"].split("/")[-1]
+    )["HoursOfOperation"]
+
+
+def describe_quick_connect(quick_connect):
+    return client.describe_quick_connect(
+        InstanceId=config["Input"]["ConnectInstanceId"],
+        QuickConnectId=quick_connect["Id"].split("/")[-1]
+    )["QuickConnect"]
+
+
+# Returns the CloudFormation logical resource name of a resource.  The name may only contain letters and numbers.
+def resource_name(summary, suffix=""):
+    return re.sub(r'[\W_]+', '', summary["Name"]) + suffix
+
+
+# Adds a described contact flow to the template.  Returns the resource name, or None when the contact flow
+# can not be exported.
+def add_contact_flow(contact_flow, properties, resource_type):
+    if properties is None:
+        return None
+    properties["InstanceArn"] = {"Fn::Sub": connect_arn}
+
+    # Make sure the CloudFormation logical resource name is valud
+    name = resource_name(contact_flow)
+    contact_flows[contact_flow["Id"]] = name
+    template["Resources"].update(
+        {name: {
+            "Type": resource_type,
+            "Properties": {
+            }
+        }})
+    print(f"Creating resource {name}")
+    # Some properties  that are returned by the API call should not be included in the output template
+    excluded_properties = ["Id", "Arn", "ResponseMetadata", "InstanceId", "Tags", "Description"]
+    keys_to_add = list(properties.keys() - set(excluded_properties))
+    properties_to_add = list(map(lambda x: {x: properties[x]}, keys_to_add))
+
+    # add the contact flow to the the CF template
+    template["Resources"][name]["Properties"].update(reduce(lambda a, b: dict(a, **b), properties_to_add))
+    print("Processing contact flow content")
+    flow_content = get_flow_content(template["Resources"][name]["Properties"]["Content"])
+
+    # Add the resource to the template
+    print("Adding the resource {resource_name} to the template")
+    flow_contents[name] = flow_content
+    template["Resources"][name]["Properties"]["Content"] = {"Fn::Sub": flow_content.content}
+    return name
+
+
+# Adds a described contact flow module to the template and returns the resource name
+def add_contact_flow_module(contact_flow_module, properties, resource_type):
+    properties["InstanceArn"] = {"Fn::Sub": connect_arn}
+
+    # CF ResourceNames should only contain letters and a '-'
+    name = resource_name(contact_flow_module, "Module")
+    contact_flow_modules[contact_flow_module["Id"]] = name
+    print(f"Creating resource {name}")
+
+    template["Resources"].update(
+        {name: {
+            "Type": resource_type,
+            "Properties": {
+            }
+        }})
+
+    # Map API response to CF properties and exclude properties that are not supported.
+    excluded_properties = ["Id", "Arn", "ResponseMetadata", "InstanceId", "Status", "Tags", "Description"]
+    keys_to_add = list(properties.keys() - set(excluded_properties))
+    properties_to_add = list(map(lambda x: {x: properties[x]}, keys_to_add))
+
+    template["Resources"][name]["Properties"].update(reduce(lambda a, b: dict(a, **b), properties_to_add))
+
+    print("Processing contact flow content")
+    flow_content = get_flow_content(template["Resources"][name]["Properties"]["Content"])
+    flow_contents[name] = flow_content
+    template["Resources"][name]["Properties"]["Content"] = {"Fn::Sub": flow_content.content}
+
+    # The API returns the state as lowercase.  CF requires it to be uppercase.
+    state = template["Resources"][name]["Properties"]["State"].upper()
+    print("Adding the resource {resource_name} to the template")
+
+    template["Resources"][name]["Properties"]["State"] = state
+    return name
+
+
+# Adds a described hours of operation to the template and returns the resource name
+def add_hours_of_operation(hours_of_operation, properties, resource_type):
+    properties["InstanceArn"] = {"Fn::Sub": connect_arn}
+
+    # CF ResourceNames should only contain letters and a '-'
+    name = resource_name(hours_of_operation, "HoursOfOperation")
+    hours_of_operations[hours_of_operation["Id"]] = name
+    template["Resources"].update(
+        {name: {
+            "Type": resource_type,
+            "Properties": {
+            }
+        }})
+    print(f"Creating resource {name}")
+    # Map API response to CF properties and exclude properties that are not supported.
+    excluded_properties = [
+        "Id",
+        "Arn",
+        "ResponseMetadata",
+        "InstanceId",
+        "HoursOfOperationId",
+        "HoursOfOperationArn",
+        "Tags",
+        "Description"
+    ]
+    keys_to_add = list(properties.keys() - set(excluded_properties))
+
+    properties_to_add = list(map(lambda x: {x: properties[x]}, keys_to_add))
+    template["Resources"][name]["Properties"].update(reduce(lambda a, b: dict(a, **b), properties_to_add))
+    if "Config" in properties:
+        template["Resources"][name]["Properties"]["Config"] = get_hours_config(properties["Config"])
+    return name
+
+
+# The resource types of the template, in the order they are added to it
+#   type     - the CloudFormation resource type
+#   describe - returns the properties of a resource, None when it can not be exported
+#   add      - adds a described resource to the template and returns the resource name
+EXPORTED_RESOURCE_TYPES = {
+    "HoursOfOperationSummaryList": {
+        "type": "AWS::Connect::HoursOfOperation",
+        "describe": describe_hours_of_operation,
+        "add": add_hours_of_operation
+    },
+    "ContactFlowSummaryList": {
+        "type": "AWS::Connect::ContactFlow",
+        "describe": describe_contact_flow,
+        "add": add_contact_flow
+    },
+    "ContactFlowModulesSummaryList": {
+        "type": "AWS::Connect::ContactFlowModule",
+        "describe": describe_contact_flow_module,
+        "add": add_contact_flow_module
+    }
+}
+
+
+# The entry point export selects the resources reachable from a few entry points instead of the resources whose
+# name contains a filter name.  ResourceFilters->EntryPoints names the contact flows to start from, by their exact
+# name, and the phone numbers whose contact flows to start from:
+#   "EntryPoints": {"ContactFlows": ["Main Menu"], "PhoneNumbers": ["+15551234567"]}
+#
+# The references of every reached contact flow and module are followed, breadth first, and only the reached
+# resources are described:
+#   TransferToFlow                        - the contact flow transferred to
+#   UpdateContactEventHooks.CustomerQueue - the customer queue flow
+#   InvokeFlowModule                      - the module
+#   CheckHoursOfOperation                 - the hours of operation
+#
+# These are the references the replace_* passes replace, so every resource a reached content references is in the
+# template.  Each reached resource is described as soon as a content referencing it is described, at most
+# concurrency at a time, so the whole frontier is described in parallel.  Returns the reached resources of each
+# type of EXPORTED_RESOURCE_TYPES as (summary, properties), sorted by name so the template does not depend on which
+# describe call finishes first.
+@profiler.profiled("reach")
+def find_reachable(entry_points, search):
+    graph = TaskGraph(max(1, concurrency), limits={"describe": max(1, concurrency)})
+    # resource id -> (summary, properties) for every resource reached so far, None until it is described
+    reached = {key: {} for key in EXPORTED_RESOURCE_TYPES}
+    lock = threading.Lock()
+
+    def reach(key, summary):
+        with lock:
+            if summary["Id"] in reached[key]:
+                return
+            reached[key][summary["Id"]] = None
+        graph.add((key, summary["Id"]), lambda: describe_reached(key, summary), kind="describe")
+
+    # A resource reached through a reference or a phone number has no summary, only its id.  Its summary is the
+    # same however it is reached, so its describe cache entry is keyed by the id alone.  Nothing in it changes when
+    # the resource is edited, so the describe cache only reuses it with the WithoutChanges option.
+    def reach_id(key, id):
+        reach(key, {"Id": id, "Name": id})
+
+    def describe_reached(key, summary):
+        describe = EXPORTED_RESOURCE_TYPES[key]["describe"]
+        if describe_cache is not None:
+            describe = describe_cache.cached(describe)
+        describe = searched_properties(describe)
+        profiler.add_items(1)
+        properties = describe(summary)
+        if properties is None:
+            return
+        id = summary["Id"]
+        summary = {
+            "Id": id,
+            "Arn": _.get(properties, "Arn") or _.get(properties, "HoursOfOperationArn"),
+            "Name": properties["Name"]
+        }
+        reached[key][id] = (summary, properties)
+        if "Content" not in properties:
+            return
+        flow_content = FlowContent(properties["Content"])
+        for contact_flow_id in referenced_contact_flow_ids(flow_content):
+            reach_id("ContactFlowSummaryList", contact_flow_id)
+        for module in flow_content.actions("InvokeFlowModule"):
+            reach_id("ContactFlowModulesSummaryList", module["Parameters"]["FlowModuleId"])
+        for hours in flow_content.actions("CheckHoursOfOperation"):
+            if "Hours" in hours["Parameters"]:
+                hours_id = hours["Parameters"]["Hours"].split("/")[-1]
+                reach_id("HoursOfOperationSummaryList", hours_id)
+
+    def reach_contact_flows():
+        for summary in find_entry_contact_flows(_.get(entry_points, "ContactFlows", []), search):
+            reach("ContactFlowSummaryList", summary)
+
+    def reach_phone_numbers():
+        for phone_number, contact_flow_arn in find_phone_number_contact_flows(_.get(entry_points, "PhoneNumbers", [])):
+            reach_id("ContactFlowSummaryList", contact_flow_arn.split("/")[-1])
+
+    print("Finding the resources reachable from the entry points...")
+    graph.add("contact flows", reach_contact_flows)
+    graph.add("phone numbers", reach_phone_numbers)
+    graph.run()
+
+    for key in EXPORTED_RESOURCE_TYPES:
+        reached[key] = sorted(filter(None, reached[key].values()), key=lambda resource: resource[0]["Name"])
+    return reached
+
+
+# Returns the summaries of the contact flows with the given names.  Every name must be the name of a contact flow.
+def find_entry_contact_flows(names, search):
+    if not names:
+        return []
+    resource_type = SEARCHABLE_RESOURCE_TYPES["ContactFlowSummaryList"]
+    summaries = search_resources(resource_type, names) if search else None
+    if summaries is None:
+        summaries = resource_type["list"]()
+    summaries = list(filter(lambda summary: summary["Name"] in names, summaries))
+    missing = set(names) - set(map(lambda summary: summary["Name"], summaries))
+    if missing:
+        raise Exception(f"The entry point contact flows {', '.join(sorted(missing))} were not found in the source "
+                        "Connect instance")
+    return summaries
+
+
+# Returns the phone number and the ARN of the contact flow of each of the phone numbers.  The phone numbers and
+# their contact flows are listed once, instead of looking up every phone number.
+def find_phone_number_contact_flows(phone_numbers):
+    if not phone_numbers:
+        return []
+    # The ARN and the identifier of each phone number -> the phone number
+    claimed = {}
+    for summary in list_resources("list_phone_numbers", "PhoneNumberSummaryList"):
+        if summary["PhoneNumber"] in phone_numbers:
+            claimed[summary["Arn"]] = claimed[summary["Id"]] = summary["PhoneNumber"]
+    missing = set(phone_numbers) - set(claimed.values())
+    if missing:
+        raise Exception(f"The entry point phone numbers {', '.join(sorted(missing))} were not found in the source "
+                        "Connect instance")
+
+    contact_flows_by_number = {}
+    for association in list_resources("list_flow_associations", "FlowAssociationSummaryList",
+                                      ResourceType="VOICE_PHONE_NUMBER"):
+        if association["ResourceId"] in claimed:
+            contact_flows_by_number[claimed[association["ResourceId"]]] = association["FlowId"]
+    missing = set(phone_numbers) - set(contact_flows_by_number)
+    if missing:
+        raise Exception(f"The entry point phone numbers {', '.join(sorted(missing))} are not associated with a "
+                        "contact flow")
+    return list(map(lambda phone_number: (phone_number, contact_flows_by_number[phone_number]), phone_numbers))
+
+
+# Exports the hours of operation, contact flows and modules as a graph of tasks, so the stages of the export
+# overlap instead of each stage waiting for the previous one to finish:
+#   list     - the three resource types are listed at the same time
+#   describe - every selected resource is described as soon as its type is listed, at most concurrency at a time
+#   add      - the resources are added to the template one at a time as soon as they are described, in the same
+#              order as the summaries, so the template is the same as when every stage ran one after the other
+#   rewrite  - the references in each distinct content are replaced as soon as the resource and the contact flows
+#              and modules it references are added, while the other resources are still described
+#
+# The rewrite runs the replace_* passes for one content in the same order as the passes over every content.  With
+# a destination the references to the destination instance are replaced as well, otherwise the references that
+# only depend on the source instance are resolved for the destination workers.
+#
+# With reachable, the resources found by find_reachable(), those resources are exported instead of listing and
+# describing the resources that match resource_filter.
+def export_resources(resource_filter, search, destination, reachable=None):
+    global inventory
+    print("Listing resources in the source Connect instance...")
+    workers = max(1, concurrency)
+    # One more worker than the describe calls, so the resources are added and rewritten while they are described
+    graph = TaskGraph(workers + 1, limits={"describe": workers})
+    inventory = {}
+    listed = {}
+    # resource id -> the task that adds the resource, for the contact flows and modules referenced by a content
+    add_tasks = {key: {} for key in EXPORTED_RESOURCE_TYPES}
+    # id of a distinct content -> the Lex attachment resources of the content, set once the content is rewritten
+    attachments = {}
+
+    def list_type(key, previous):
+        with profiler.stage("list"):
+            if reachable is None:
+                listed[key] = list_inventory_type(resource_filter, key, search)
+            else:
+                listed[key] = (list(map(lambda resource: resource[0], reachable[key])), "reach")
+            profiler.add_items(len(listed[key][0]))
+        inventory[key] = listed[key][0]
+
+        resource_type = EXPORTED_RESOURCE_TYPES[key]
+        describe = resource_type["describe"]
+        if reachable is not None:
+            # The reached resources are already described
+            described_by_id = {summary["Id"]: properties for summary, properties in reachable[key]}
+            describe = lambda summary: described_by_id[summary["Id"]]
+        else:
+            describe = searched_properties(describe_cache.cached(describe) if describe_cache is not None else describe)
+        for index, summary in enumerate(resource_filter.select(inventory[key])):
+            described = graph.add(("describe", key, index), lambda summary=summary: describe_summary(describe, summary),
+                                  kind="describe", priority=2)
+            added = ("add", key, index)
+            add_tasks[key][summary["Id"]] = added
+            graph.add(added, lambda summary=summary, added=added, described=described: add(key, summary, added,
+                                                                                           described),
+                      [described, previous])
+            previous = added
+        graph.add(("added", key), lambda: None, [previous])
+
+    def take_inventory():
+        print_inventory(listed)
+        source_module_names.update({summary["Id"].split("/")[-1]: summary["Name"]
+                                    for summary in inventory["ContactFlowModulesSummaryList"]})
+
+    def add(key, summary, added, described):
+        name = EXPORTED_RESOURCE_TYPES[key]["add"](summary, graph.results[described], EXPORTED_RESOURCE_TYPES[key]["type"])
+        if name is None or name not in flow_contents or id(flow_contents[name]) in attachments:
+            return
+        flow_content = flow_contents[name]
+        attachments[id(flow_content)] = []
+        dependencies = [added]
+        dependencies.extend(filter(None, map(add_tasks["ContactFlowSummaryList"].get,
+                                             referenced_contact_flow_ids(flow_content))))
+        dependencies.extend(filter(None, map(lambda module: add_tasks["ContactFlowModulesSummaryList"].get(
+                                                 module["Parameters"]["FlowModuleId"]),
+                                             flow_content.actions("InvokeFlowModule"))))
+        graph.add(("rewrite", name), lambda: rewrite(name, flow_content), dependencies, priority=1)
+
+    def rewrite(name, flow_content):
+        with profiler.stage("rewrite"):
+            profiler.add_items(1)
+            attachments[id(flow_content)] = rewrite_references(name, flow_content, destination)
+
+    # The first resource is added once every resource type is listed, so the tasks of every resource are known
+    previous = "inventory"
+    for key in EXPORTED_RESOURCE_TYPES:
+        graph.add(("list", key), lambda key=key, previous=previous: list_type(key, previous), priority=0)
+        previous = ("added", key)
+    graph.add("inventory", take_inventory, [("list", key) for key in EXPORTED_RESOURCE_TYPES])
+    graph.run()
+
+    # The Lex permissions are added after every other resource, in the order of the contents
+    for resource, flow_content in distinct_contents():
+        for attachment in attachments[id(flow_content)]:
+            template["Resources"].update(attachment)
+
+
+def describe_summary(describe, summary):
+    with profiler.stage("describe"):
+        profiler.add_items(1)
+        return describe(summary)
+
+
+# Runs the replace_* passes for one distinct content.  Returns the Lex attachment resources of the content.
+# Without a destination only the references to the source instance are replaced and resolved, the destination
+# workers replace the rest.
+def rewrite_references(resource, flow_content, destination):
+    replace_contact_flow_references(flow_content)
+    replace_hours_references(flow_content)
+    if destination is None:
+        resolve_content_source_references(flow_content)
+        return []
+    replace_with_mappings(flow_content.rewriter, flow_content, destination)
+    replace_module_references(resource, flow_content, destination)
+    return replace_lexbot_references(flow_content, destination)
+
+
+# Contact flows and modules with the same content, e.g. the copies of a flow for each brand, share one FlowContent.
+# The content is parsed and rewritten once and every pass handles it once, no matter how many resources use it.
+#
+# The content is hashed as it is returned by Connect.  The account, region and instance in the ARNs are the same
+# for every resource of the source instance, so the same content is always rewritten to the same result.
+@profiler.profiled("parse content")
+def get_flow_content(content):
+    digest = hashlib.sha256(content.encode("utf-8")).hexdigest()
+    if digest not in distinct_flow_contents:
+        flow_content = FlowContent(content)
+        rewrite_content(flow_content)
+
+        # Associate any Lambdas found to the Connect instance
+        attach_lambdas(flow_content)
+        distinct_flow_contents[digest] = flow_content
+    return distinct_flow_contents[digest]
+
+
+# Hours of operation with the same schedule share one Config in the template
+def get_hours_config(hours_config):
+    digest = hashlib.sha256(json.dumps(hours_config, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+    return distinct_hours_configs.setdefault(digest, hours_config)
+
+
+# Returns the resource name and the content of every distinct content in flow_contents.  The resource is the first
+# one with the content.
+def distinct_contents():
+    seen = set()
+    for resource, flow_content in flow_contents.items():
+        if id(flow_content) not in seen:
+            seen.add(id(flow_content))
+            profiler.add_items(1)
+            yield resource, flow_content
+
+
+def print_dedup_statistics():
+    print(f"{'Deduplicated':<32}{'Resources':>10}{'Distinct':>10}{'Ratio':>8}")
+    flows = len(flow_contents)
+    distinct_flows = len(set(map(id, flow_contents.values())))
+    print(f"{'Contact flows and modules':<32}{flows:>10}{distinct_flows:>10}{flows / max(1, distinct_flows):>8.2f}")
+    hours = len(hours_of_operations)
+    distinct_hours = len(distinct_hours_configs)
+    print(f"{'Hours of operation':<32}{hours:>10}{distinct_hours:>10}{hours / max(1, distinct_hours):>8.2f}")
+
+
+@profiler.profiled("attach_lambdas")
+def attach_lambdas(flow_content):
+    for attachment in flow_content.actions("InvokeLambdaFunction"):
+        lambda_arn = replace_pseudo_parms(_.get(attachment, "Parameters.LambdaFunctionARN"))
+        lambda_name = lambda_arn.split(":")[-1]
+        resource_name = re.sub(r'[\W_]+', '', lambda_name)+"LambdaPermission"
+
+        print(f"Creating an AttachLambda resource for {lambda_name}")
+        template["Resources"].update(
+            {
+                resource_name: {
+                    "Type": "Custom::ConnectAssociateLambda",
+                    "Properties": {
+                        "InstanceId": {"Ref": "ConnectInstanceID"},
+                        "FunctionArn": {"Fn::Sub": lambda_arn},
+                        "ServiceToken": {"Fn::ImportValue": "CFNConnectAssociateLambda"}
+                    }
+                }
+            })
+
+
+def get_lexv2_client():
+    return get_client('lexv2-models', concurrency=concurrency)
+
+
+# Lists the names of every Lex V2 bot in the source account once.  Returns bot id -> bot name
+@lru_cache(maxsize=None)
+def list_source_bot_names():
+    print("Retrieving the Lex V2 bots in the source account...")
+    bot_names = {}
+    response = get_lexv2_client().list_bots(maxResults=1000)
+    while(True):
+        for bot in response["botSummaries"]:
+            bot_names[bot["botId"]] = bot["botName"]
+        if "nextToken" not in response:
+            break
+        response = get_lexv2_client().list_bots(maxResults=1000, nextToken=response["nextToken"])
+    return bot_names
+
+
+# Lists the aliases of a source bot the first time the bot is referenced.  Returns alias id -> alias name
+@lru_cache(maxsize=None)
+def list_source_bot_aliases(bot_id):
+    alias_names = {}
+    response = get_lexv2_client().list_bot_aliases(botId=bot_id, maxResults=1000)
+    while(True):
+        for alias in response["botAliasSummaries"]:
+            alias_names[alias["botAliasId"]] = alias["botAliasName"]
+        if "nextToken" not in response:
+            break
+        response = get_lexv2_client().list_bot_aliases(botId=bot_id, maxResults=1000, nextToken=response["nextToken"])
+    return alias_names
+
+
+# lex_id is the resource part of the alias ARN: bot-alias/<bot id>/<alias id>
+# The names are resolved from the bulk listings above, so each bot and alias is only looked up once
+# no matter how many actions reference it.  The details only depend on the source account and are kept
+# in source_lex_details.
+#
+# The contents are rewritten by several threads at once, so the lookups hold source_lock to list the bots once.
+def get_lexbot_details(lex_id):
+    with source_lock:
+        if lex_id in source_lex_details:
+            return source_lex_details[lex_id]
+
+        bot_id = lex_id.split("/")[1]
+        alias_id = lex_id.split("/")[2]
+
+        bot_name = list_source_bot_names().get(bot_id)
+        if bot_name is None:
+            bot_name = get_lexv2_client().describe_bot(botId=bot_id)["botName"]
+        alias_name = list_source_bot_aliases(bot_id).get(alias_id)
+        if alias_name is None:
+            alias_name = get_lexv2_client().describe_bot_alias(botAliasId=alias_id, botId=bot_id)["botAliasName"]
+
+        source_lex_details[lex_id] = {
+            "alias": alias_name,
+            "name": bot_name,
+            "botId": bot_id,
+            "botAliasId": alias_id,
+            "botAliasName": alias_name
+        }
+        return source_lex_details[lex_id]
+
+
+def create_lexV2_attachment_resource(lex_arn, lex_details):
+    resource_name = re.sub(r'[\W_]+', '', lex_details["name"])+"LexPermission"
+    print(f"Creating an AttachLex resource for {lex_details['name']}")
+    return {
+            resource_name: {
+                "Type": "Custom::ConnectAssociateLex",
+                "Properties": {
+                    "InstanceId": {"Ref": "ConnectInstanceID"},
+                    "AliasArn": {"Fn::Sub": lex_arn},
+                    "ServiceToken": {"Fn::ImportValue": "CFNConnectAssociateLexV2Bot"}
+                }
+            }
+        }
+
+
+# Uses the Connect APIs to retrieve quick connects from the Connect instance
+# the format of the exported contact flows is not the same as what are exported from
+def export_quick_connects(resource_filter, resource_type):
+    matching_quick_connects = resource_filter.select(list_resources("list_quick_connects",
+                                                                    "QuickConnectSummaryList",
+                                                                    QuickConnectTypes=["USER",
+                                                                                       "QUEUE",
+                                                                                       "PHONE_NUMBER"]))
+
+    for quick_connect, properties in zip(matching_quick_connects,
+                                         describe_resources(describe_quick_connect, matching_quick_connects)):
+        properties["InstanceArn"] = {"Fn::Sub": connect_arn}
+        resource_name = re.sub(r'[\W_]+', '', quick_connect["Name"])+"QuickConnect"
+        quick_connects[quick_connect["Id"]] = resource_name
+        template["Resources"].update(
+            {resource_name: {
+                "Type": resource_type,
+                "Properties": {
+                }
+            }})
+        excluded_properties = ["Id",
+                               "Arn",
+                               "ResponseMetadata",
+                               "InstanceId",
+                               "QuickConnectId",
+                               "QuickConnectARN",
+                               "Tags",
+                               "Description"]
+        keys_to_add = list(properties.keys() - set(excluded_properties))
+
+        properties_to_add = list(map(lambda x: {x: properties[x]}, keys_to_add))
+        template["Resources"][resource_name]["Properties"].update(reduce(lambda a, b: dict(a, **b), properties_to_add))
+
+
+# By the time this method is called, the original arn that is contained in the exported contact flow
+# has been converted from this:
+#
+# arn:aws:connect:us-east-1:987654321:instance/aaaaaa-bbbb-cc1c-dddd-123456789abc/flowid/a1a2a3-dddd-a1b1-dddd-123456789abc
+#
+# to this
+#
+# arn:${AWS::Partition}:connect:${AWS::Region}:${AWS::AccountId}:flowid/instance/${ConnectInstandId}/flowid/a1a2a3-dddd-a1b1-dddd-123456789abc
+#
+# Now we need to replace the resource identifier GUIDs with the contact flow ARNs of the newly created resources
+# using the CloudFormation !Ref and !GetAtt intrinsic functions
+#
+# arn:${AWS::Partition}:connect:${AWS::Region}:${AWS::AccountId}:flowid/instance/${ConnectInstandId}/flowid/${SampleFlow.ContactFlowArn}
+#
+# the CloudFormation resource names to identifiers mapping was created while the ContactFlows were being
+# exported.
+@profiler.profiled("replace_contact_flowids")
+def replace_contact_flowids():
+    for resource, flow_content in distinct_contents():
+        replace_contact_flow_references(flow_content)
+
+
+def replace_contact_flow_references(flow_content):
+    # Transfer to agent actions can reference contact flows
+    for transfer in flow_content.actions("TransferToFlow"):
+        contact_flow_arn = replace_pseudo_parms(transfer["Parameters"]["ContactFlowId"])
+        contact_flow_id = contact_flow_arn.split("/")[-1]
+        if contact_flow_id not in contact_flows:
+            print(f"Warning: the contact flow {contact_flow_id} referenced by a TransferToFlow action is not exported")
+            continue
+
+        new_arn = contact_flow_arn.replace(contact_flow_id, "${" + contact_flows[contact_flow_id] + ".ContactFlowArn}")
+        print(f"Replaced contact flow reference with {new_arn} in a TransferToFlow action")
+        flow_content.replace(contact_flow_arn, new_arn)
+
+    # As can UpdateContactEventHooks...
+    for module in flow_content.actions("UpdateContactEventHooks"):
+        customer_queue = _.get(module,"Parameters.EventHooks.CustomerQueue")
+        if(customer_queue is None):
+            continue
+        contact_flow_arn = replace_pseudo_parms(customer_queue)
+        contact_flow_id = contact_flow_arn.split("/")[-1]
+        if contact_flow_id not in contact_flows:
+            print(f"Warning: the contact flow {contact_flow_id} referenced by a UpdateContactEventHooks action is "
+                  "not exported")
+            continue
+        new_arn = "${" + contact_flows[contact_flow_id] + ".ContactFlowArn}"
+        print(f"Replaced a contact flow reference with {new_arn} in a UpdateContactEventHooks action")
+        flow_content.replace(contact_flow_arn, new_arn)
+
+
+# Returns the contact flow identifier in the destination instance based on the manifest file
+# by the identifier referenced in the source contact flow
+#
+# This allows contact flows to reference pre-existing contact flows in the destination Connect instance
+# that are not being exported
+def get_dest_contact_flow_module(contact_flow_id, destination):
+    # first look in the current Connect instance
+    contact_flow_name = get_source_module_name(contact_flow_id)
+    id = _.get(destination.manifest_entry("ContactFlowModulesSummaryList", contact_flow_name), "Id")
+    return {
+        "name": contact_flow_name,
+        "id": id
+    }
+
+
+# Returns the name of a module in the source Connect instance.  The names of the active modules are known from
+# the inventory.  Any other module is described once and added to source_module_names.
+def get_source_module_name(contact_flow_id):
+    with source_lock:
+        if contact_flow_id not in source_module_names:
+            source_module_names[contact_flow_id] = client.describe_contact_flow_module(
+                InstanceId=config["Input"]["ConnectInstanceId"],
+                ContactFlowModuleId=contact_flow_id
+            )["ContactFlowModule"]["Name"]
+        return source_module_names[contact_flow_id]
+
+
+# This is the same concept as replace_contact_flowids() for contact flow modules
+@profiler.profiled("replace_contact_module_flowids")
+def replace_contact_module_flowids(destination):
+    for resource, flow_content in distinct_contents():
+        replace_module_references(resource, flow_content, destination)
+
+
+def replace_module_references(resource, flow_content, destination):
+    for module in flow_content.actions("InvokeFlowModule"):
+        contact_flow_id = module["Parameters"]["FlowModuleId"]
+        if(contact_flow_id not in contact_flow_modules):
+            dest_module = get_dest_contact_flow_module(contact_flow_id, destination)
+            if(dest_module["id"] is None):
+                raise Exception(
+                    f"The referenced module ${dest_module['name']} " +
+                    f"in the contact flow ${resource} was not exported and not found in " +
+                    "in the destination Connect instance")
+            new_arn = dest_module["id"]
+        else:
+
+            new_arn = "${" + contact_flow_modules[contact_flow_id] + "}"
+
+        print(f"Replaced a contact flow module reference with {new_arn} in a InvokeFlowModule action")
+        flow_content.replace(contact_flow_id, new_arn)
+
+
+def get_dest_lex_bot(alias_arn, lex_details, destination):
+    dest_id = alias_arn.split(":")[-1]
+    bot_id = dest_id.split("/")[1]
+    alias_id = dest_id.split("/")[2]
+
+    dest_bot, dest_alias = destination.lex_alias(lex_details["name"], lex_details["botAliasName"])
+    dest_arn = alias_arn.replace(bot_id, dest_bot["botId"]).replace(alias_id, dest_alias["botAliasId"])
+    return dest_arn
+
+
+@profiler.profiled("replace_lexbot_ids")
+def replace_lexbot_ids(destination):
+    attachment_resources = []
+    for resource, flow_content in distinct_contents():
+        attachment_resources.extend(replace_lexbot_references(flow_content, destination))
+
+    # add resources to add Lex permissions to the Connect instance
+    # This can't be done inline while iterating through the template["Resources"]
+    for attachment in attachment_resources:
+        template["Resources"].update(attachment)
+
+
+# Returns the resources that add the Lex permissions of the bots referenced by the content
+def replace_lexbot_references(flow_content, destination):
+    attachment_resources = []
+    for lex_action in flow_content.actions("ConnectParticipantWithLexBot"):
+        alias_arn = replace_pseudo_parms(_.get(lex_action, "Parameters.LexV2Bot.AliasArn"))
+        lex_id = alias_arn.split(":")[-1]
+        lex_details = get_lexbot_details(lex_id)
+        dest_arn = get_dest_lex_bot(alias_arn, lex_details, destination)
+
+#        print(f"Replaced a contact flow module reference with {new_arn} in a InvokeFlowModule action")
+        flow_content.replace(alias_arn, dest_arn)
+        attachment_resources.append(create_lexV2_attachment_resource(dest_arn, lex_details))
+    return attachment_resources
+
+
+# This is the same concept as replace_contact_flowids() for contact flow modules
+@profiler.profiled("replace_hours_of_operation")
+def replace_hours_of_operation():
+    for resource, flow_content in distinct_contents():
+        replace_hours_references(flow_content)
+
+
+def replace_hours_references(flow_content):
+    for hours in flow_content.actions("CheckHoursOfOperation"):
+        # Hours is optional in CheckHoursOfOperations.
+        # If it is not specified. Hours attached to the current queue are checked.
+        if "Hours" not in hours["Parameters"]:
+            continue
+
+        hours_arn = replace_pseudo_parms(hours["Parameters"]["Hours"])
+        hours_id = hours_arn.split("/")[-1]
+        if hours_id not in hours_of_operations:
+            print(f"Warning: the hours of operation {hours_id} referenced by a CheckHoursOfOperation action is not "
+                  "exported")
+            continue
+        new_arn =\
+            "arn:${AWS::Partition}:connect:${AWS::Region}:" +\
+            "${AWS::AccountId}:instance/${ConnectInstanceID}/operating-hours/${" + \
+            hours_of_operations[hours_id]+".HoursOfOperationArn}"
+
+        print(f"Replaced an hours of opertation reference with {new_arn} in a InvokeFlowModule action")
+        flow_content.replace(hours_arn, new_arn)
+
+
+# Resolves the references that only depend on the source instance: the names of the referenced modules that
+# are not exported and the names of the referenced Lex bots and aliases.  Once they are resolved the
+# destination stages do not call the source instance.
+@profiler.profiled("resolve_source_references")
+def resolve_source_references():
+    for resource, flow_content in distinct_contents():
+        resolve_content_source_references(flow_content)
+
+
+def resolve_content_source_references(flow_content):
+    for module in flow_content.actions("InvokeFlowModule"):
+        if module["Parameters"]["FlowModuleId"] not in contact_flow_modules:
+            get_source_module_name(module["Parameters"]["FlowModuleId"])
+    for lex_action in flow_content.actions("ConnectParticipantWithLexBot"):
+        alias_arn = replace_pseudo_parms(_.get(lex_action, "Parameters.LexV2Bot.AliasArn"))
+        get_lexbot_details(alias_arn.split(":")[-1])
+
+
+# Maps the phone numbers, audio prompts and queues of every contact flow and module to the destination instance
+@profiler.profiled("replace_mapped_ids")
+def replace_mapped_ids(destination):
+    for resource, flow_content in distinct_contents():
+        replace_with_mappings(flow_content.rewriter, flow_content, destination)
+
+
+# The stages that depend on the destination instance, through the manifest file and PhoneNumberMappings
+def replace_destination_ids(destination):
+    replace_mapped_ids(destination)
+    replace_contact_module_flowids(destination)
+    replace_lexbot_ids(destination)
+    serialize_flow_contents()
+
+
+# Runs the destination stages for one destination of the Destinations section and returns its template.  This runs
+# in a worker process with the result of the source export, so the source instance is only exported once for every
+# destination.  The source export is set as the module state for the call and the previous state is restored
+# afterwards, so a failed destination does not leave its template behind for the next one.
+def export_destination(source_export, destination):
+    previous = {key: globals().get(key) for key in source_export}
+    globals().update(source_export)
+    try:
+        destination = Destination(destination["Filename"],
+                                  destination["ManifestFileName"],
+                                  destination["PhoneNumberMappings"] if "PhoneNumberMappings" in destination else {})
+        replace_destination_ids(destination)
+        return output_template(destination)
+    finally:
+        globals().update(previous)
+
+
+# Adds the content of every contact flow and module to the template.  Each distinct content is serialized once,
+# with the references replaced by all of the replace_* passes, and the copies share the serialized string.
+@profiler.profiled("serialize")
+def serialize_flow_contents():
+    serialized = {}
+    profiler.add_items(len(flow_contents))
+    for resource, flow_content in flow_contents.items():
+        if id(flow_content) not in serialized:
+            serialized[id(flow_content)] = flow_content.serialize()
+        template["Resources"][resource]["Properties"]["Content"] = {"Fn::Sub": [serialized[id(flow_content)], {}]}
+
+
+# Collects every substitution for a piece of contact flow content into one table and applies all of them
+# in a single scan of the content, instead of one str.replace per substitution.
+#
+# The substitutions that are the same for every content, e.g. PhoneNumberMappings, are kept in a SubstitutionTable
+# shared by the rewriters instead of being copied into each of them.  The content is still scanned once: at each
+# position the longest value of either table is replaced.
+class ContentRewriter:
+    def __init__(self, substitutions=None):
+        self.substitutions = {}
+        self.shared = None
+        self.update(substitutions or {})
+
+    def add(self, old, new):
+        if not old:
+            return
+        # The first substitution for a value wins, the same as when the replacements were chained
+        current = self.substitution(old)
+        if current is not None:
+            if current != new:
+                print(f"Warning: {old} is mapped to both {current} and {new}. Using {current}")
+            return
+        self.substitutions[old] = new
+
+    def update(self, substitutions):
+        for old, new in substitutions.items():
+            self.add(old, new)
+
+    # Adds the substitutions of a shared table, as update() would.  The values added before keep their
+    # substitution.
+    def share(self, table):
+        for old, new in self.substitutions.items():
+            if old in table.substitutions and table.substitutions[old] != new:
+                print(f"Warning: {old} is mapped to both {new} and {table.substitutions[old]}. Using {new}")
+        self.shared = table
+
+    def substitution(self, old):
+        if old in self.substitutions:
+            return self.substitutions[old]
+        if self.shared is not None:
+            return self.shared.substitutions.get(old)
+        return None
+
+    def apply(self, content):
+        tables = []
+        if self.substitutions:
+            tables.append((compile_substitutions(frozenset(self.substitutions)), self.substitutions))
+        if self.shared is not None and self.shared.substitutions:
+            tables.append((self.shared.compiled(), self.shared.substitutions))
+        if not tables:
+            return content
+        if len(tables) == 1:
+            pattern, substitutions = tables[0]
+            return pattern.sub(lambda match: substitutions[match.group(0)], content)
+        return substitute_longest(content, tables)
+
+
+# A table of substitutions shared by every content of an export or a destination.  It is compiled, and its
+# overlapping values are reported, once instead of once for every content.
+class SubstitutionTable:
+    def __init__(self, substitutions):
+        self.substitutions = {old: new for old, new in substitutions.items() if old}
+        self.pattern = None
+        self.lock = threading.Lock()
+
+    def compiled(self):
+        with self.lock:
+            if self.pattern is None:
+                self.pattern = compile_substitutions(frozenset(self.substitutions))
+            return self.pattern
+
+    def apply(self, content):
+        if not self.substitutions:
+            return content
+        return self.compiled().sub(lambda match: self.substitutions[match.group(0)], content)
+
+
+# Replaces the values of several compiled tables in one scan of the content.  At each position the longest value
+# of any table is replaced, and of two equal values the one of the first table, the same as with a single table
+# that holds every value.
+def substitute_longest(content, tables):
+    parts = []
+    position = 0
+    matches = list(map(lambda table: table[0].search(content), tables))
+    while True:
+        best = None
+        for index, (pattern, substitutions) in enumerate(tables):
+            # A match that starts inside the value replaced last is searched again after it
+            if matches[index] is not None and matches[index].start() < position:
+                matches[index] = pattern.search(content, position)
+            match = matches[index]
+            if match is not None and (best is None or match.start() < best.start()
+                                      or (match.start() == best.start() and match.end() > best.end())):
+                best, best_substitutions = match, substitutions
+        if best is None:
+            break
+        parts.append(content[position:best.start()])
+        parts.append(best_substitutions[best.group(0)])
+        position = best.end()
+    parts.append(content[position:])
+    return "".join(parts)
+
+
+# Compiles the values to replace into a single regular expression.  The values are arranged as a trie so
+# values with a common prefix (phone numbers, ARNs) share states, and at any position the longest value wins.
+#
+# Flows that use the same prompts and queues share the same set of values, so the compiled expression is cached.
+@lru_cache(maxsize=128)
+def compile_substitutions(values):
+    trie = {}
+    for value in values:
+        node = trie
+        for char in value:
+            node = node.setdefault(char, {})
+        node[""] = {}
+
+    def to_pattern(node):
+        alternatives = list(map(lambda char: re.escape(char) + to_pattern(node[char]), sorted(node.keys() - {""})))
+        if not alternatives:
+            return ""
+        if len(alternatives) == 1 and "" not in node:
+            return alternatives[0]
+        pattern = "(?:" + "|".join(alternatives) + ")"
+        return pattern + "?" if "" in node else pattern
+
+    pattern = re.compile(to_pattern(trie))
+
+    # A value that contains another value overlaps it.  Only the longest value is replaced where both match.
+    for value in sorted(values):
+        node = trie
+        for char in value:
+            node = node[char]
+        overlapping = pattern.search(value, 1)
+        if len(node) > 1 or overlapping is not None:
+            print(f"Warning: {value} overlaps another mapped value. The longest value is replaced first")
+
+    return pattern
+
+
+# The content of a contact flow or module, parsed once and shared by every pass that reads it.
+# The actions are indexed by Type and by the ARNs they reference.
+#
+# flow holds the content as it was returned by Connect, so ARNs read from it still contain the account number,
+# region and partition.  Use replace_pseudo_parms() to get the ARN as it appears in content.
+#
+# The replace_* passes record the references they replace with replace().  serialize() applies all of them
+# in a single pass over content once every pass has run.
+class FlowContent:
+    def __init__(self, content):
+        self.content = content
+        self.flow = json.loads(content)
+        self.rewriter = ContentRewriter()
+        # The content once every pass has run, set by the streaming export
+        self.serialized = None
+        self.actions_by_type = {}
+        self.actions_by_arn = {}
+        for action in self.flow.get("Actions", []):
+            self.actions_by_type.setdefault(action["Type"], []).append(action)
+            for arn in referenced_arns(action.get("Parameters", {})):
+                self.actions_by_arn.setdefault(arn, []).append(action)
+
+    def metadata(self):
+        return _.get(self.flow, "Metadata.ActionMetadata", {})
+
+    def actions(self, action_type):
+        return self.actions_by_type.get(action_type, [])
+
+    def actions_referencing(self, arn):
+        return self.actions_by_arn.get(arn, [])
+
+    def replace(self, old, new):
+        self.rewriter.add(old, new)
+
+    def serialize(self):
+        return self.rewriter.apply(self.content)
+
+
+# Returns every ARN found in the parameters of an action
+def referenced_arns(parameters):
+    if isinstance(parameters, dict):
+        return [arn for value in parameters.values() for arn in referenced_arns(value)]
+    if isinstance(parameters, list):
+        return [arn for value in parameters for arn in referenced_arns(value)]
+    if isinstance(parameters, str) and parameters.startswith("arn:"):
+        return [parameters]
+    return []
+
+
+# There are default audio prompts and queues that come with a Connect instance
+# map the identifiers to the destination Connect instance
+def replace_with_mappings(rewriter, flow_content, destination):
+    replace_with_config_mappings(rewriter, destination)
+    metadata = flow_content.metadata()
+    for flow_command in metadata:
+        action = metadata[flow_command]
+        replace_with_mappings_audio_prompt(rewriter, action, destination)
+        replace_with_mappings_queue(rewriter, action, destination)
+
+
+# Map the phone number from the destination Connect instance to the source connect instance
+def replace_with_config_mappings(rewriter, destination):
+    rewriter.share(destination.phone_number_table)
+
+
+def replace_with_mappings_audio_prompt(rewriter, action, destination):
+    if "audio" in action:
+        print("Remapping audio prompts based on the manifest file...")
+        for audio in action["audio"]:
+            if(_.get(audio, "type") == "Prompt"):
+                text = _.get(audio, "text")
+                source_id = _.get(audio, "id").split("/")[-1]
+                dest_id = _.get(destination.manifest_entry("PromptSummaryList", text), "Id")
+                if dest_id is None:
+                    print(f"Warning: the audio prompt {text} was not found in the manifest file")
+                    continue
+                rewriter.add(source_id, dest_id)
+
+
+def replace_with_mappings_queue(rewriter, action, destination):
+    if "queue" in action:
+        print("Remapping queue identifiers based on the manifest file...")
+        text = _.get(action, "queue.text")
+        queue_id = _.get(action, "queue.id")
+        if(queue_id is not None):
+            source_id = queue_id.split("/")[-1]
+            dest_id = _.get(destination.manifest_entry("QueueSummaryList", text), "Id")
+            if dest_id is not None:
+                rewriter.add(source_id, dest_id)
+
+
+# Replace the hard coded partition, region, account number and Connect Instance ID with parameters.  The table is
+# compiled once for the source instance.
+@lru_cache(maxsize=16)
+def pseudo_parm_table(account_number, partition, region, connect_instance_id):
+    return SubstitutionTable({
+        account_number: "${AWS::AccountId}",
+        partition: "${AWS::Partition}",
+        region: "${AWS::Region}",
+        connect_instance_id: "${ConnectInstanceID}"
+    })
+
+
+@profiler.profiled("replace_pseudo_parms")
+def replace_pseudo_parms(content):
+    return pseudo_parm_table(account_number, partition, region, config["Input"]["ConnectInstanceId"]).apply(content)
+
+
+# Replaces the hard coded partition, region, account number and Connect Instance ID in the content of a contact
+# flow or module with parameters.  The phone numbers, audio prompts and queues depend on the destination and
+# are mapped later by replace_mapped_ids()
+def rewrite_content(flow_content):
+    flow_content.content = replace_pseudo_parms(flow_content.content)
+
+
+# CloudFormation allows 500 resources per stack and 1 MB for a template uploaded to S3.  The nested stacks are
+# kept below these limits to leave room for the cross-stack parameters and outputs.
+MAX_STACK_RESOURCES = 400
+MAX_STACK_TEMPLATE_SIZE = 900000
+
+PERMISSION_RESOURCE_TYPES = ["Custom::ConnectAssociateLambda", "Custom::ConnectAssociateLex"]
+
+# Matches the references to other resources in a Fn::Sub string: ${Resource} and ${Resource.Attribute}
+SUB_VARIABLE = re.compile(r'\$\{([A-Za-z0-9]+)(?:\.([A-Za-z0-9]+))?\}')
+
+
+# Calls rewrite for every Fn::Sub string in a resource and stores the result in place.
+# Returns the Fn::Sub strings.
+def rewrite_sub_strings(value, rewrite=lambda string: string):
+    strings = []
+    if isinstance(value, dict):
+        for key, item in value.items():
+            if key == "Fn::Sub" and isinstance(item, str):
+                value[key] = rewrite(item)
+                strings.append(value[key])
+            elif key == "Fn::Sub":
+                item[0] = rewrite(item[0])
+                strings.append(item[0])
+            else:
+                strings.extend(rewrite_sub_strings(item, rewrite))
+    elif isinstance(value, list):
+        for item in value:
+            strings.extend(rewrite_sub_strings(item, rewrite))
+    return strings
+
+
+# Builds the reference graph of the generated template.
+#   references  - resource -> the resources it references.  The replace_* passes turned the TransferToFlow,
+#                 UpdateContactEventHooks.CustomerQueue, InvokeFlowModule and CheckHoursOfOperation references
+#                 into ${Resource} and ${Resource.Attribute} variables in the Fn::Sub strings.
+#   permissions - resource -> the Lambda and Lex permission resources for the functions and bots it invokes
+def build_reference_graph(resources):
+    permission_arns = {}
+    for name, resource in resources.items():
+        if resource["Type"] in PERMISSION_RESOURCE_TYPES:
+            for arn in rewrite_sub_strings(resource["Properties"]):
+                permission_arns[arn] = name
+    permission_pattern = compile_substitutions(frozenset(permission_arns)) if permission_arns else None
+
+    references = {}
+    permissions = {}
+    for name, resource in resources.items():
+        if resource["Type"] in PERMISSION_RESOURCE_TYPES:
+            continue
+        references[name] = set()
+        permissions[name] = set()
+        for string in rewrite_sub_strings(resource["Properties"]):
+            for match in SUB_VARIABLE.finditer(string):
+                if match.group(1) in resources and match.group(1) != name:
+                    references[name].add(match.group(1))
+            if permission_pattern is not None:
+                for match in permission_pattern.finditer(string):
+                    permissions[name].add(permission_arns[match.group(0)])
+    return references, permissions
+
+
+# Groups the resources into the connected components of the reference graph.  Resources in different
+# components do not reference each other, so they can be deployed in parallel.
+def find_components(names, references):
+    parents = {name: name for name in names}
+
+    def find(name):
+        while parents[name] != name:
+            parents[name] = parents[parents[name]]
+            name = parents[name]
+        return name
+
+    for name in names:
+        for reference in references[name]:
+            parents[find(name)] = find(reference)
+
+    components = {}
+    for name in names:
+        components.setdefault(find(name), []).append(name)
+    return list(components.values())
+
+
+# Splits a component that does not fit in one stack.  The resources are ordered so the resources they
+# reference come first, so a piece only references resources in the same or an earlier piece.
+def split_component(component, references, sizes):
+    ordered = []
+    visited = set()
+    for root in component:
+        if root in visited:
+            continue
+        visited.add(root)
+        stack = [(root, iter(sorted(references[root])))]
+        while stack:
+            name, children = stack[-1]
+            child = next(children, None)
+            if child is None:
+                stack.pop()
+                ordered.append(name)
+            elif child not in visited:
+                visited.add(child)
+                stack.append((child, iter(sorted(references[child]))))
+
+    pieces = [[]]
+    size = 0
+    for name in ordered:
+        if pieces[-1] and (len(pieces[-1]) >= MAX_STACK_RESOURCES or size + sizes[name] > MAX_STACK_TEMPLATE_SIZE):
+            pieces.append([])
+            size = 0
+        pieces[-1].append(name)
+        size += sizes[name]
+
+    piece_index = {name: index for index, piece in enumerate(pieces) for name in piece}
+    for name in ordered:
+        later = list(filter(lambda reference: piece_index[reference] > piece_index[name], references[name]))
+        if later:
+            print(f"Warning: {name} and {later[0]} reference each other, the nested stacks will have a circular dependency")
+    return pieces
+
+
+# Packs the components into stacks of about the same size.  Largest components are placed first, each into
+# the smallest stack that still has room for it.
+def pack_stacks(units, sizes, stack_count):
+    unit_sizes = list(map(lambda unit: sum(map(lambda name: sizes[name], unit)), units))
+    stack_count = max(stack_count,
+                      -(-sum(unit_sizes) // MAX_STACK_TEMPLATE_SIZE),
+                      -(-sum(map(len, units)) // MAX_STACK_RESOURCES))
+    stack_count = max(1, min(stack_count, len(units)))
+
+    stacks = [[] for _ in range(stack_count)]
+    stack_sizes = [0] * stack_count
+    for index in sorted(range(len(units)), key=lambda index: -unit_sizes[index]):
+        candidates = list(filter(
+            lambda stack: stack_sizes[stack] + unit_sizes[index] <= MAX_STACK_TEMPLATE_SIZE and
+            len(stacks[stack]) + len(units[index]) <= MAX_STACK_RESOURCES,
+            range(len(stacks))))
+        if not candidates:
+            stacks.append([])
+            stack_sizes.append(0)
+            candidates = [len(stacks) - 1]
+        stack = min(candidates, key=lambda stack: stack_sizes[stack])
+        stacks[stack].extend(units[index])
+        stack_sizes[stack] += unit_sizes[index]
+    return list(filter(None, stacks))
+
+
+# Writes the template as a parent stack with nested child stacks that CloudFormation can deploy in parallel.
+#
+# Contact flows, modules and hours of operation that reference each other are kept in the same child stack
+# whenever possible and the child stacks are balanced by size.  A reference between child stacks is passed
+# through an output of the stack that owns the resource and a parameter of the stack that references it.
+# The Lambda and Lex permission resources are placed in their own child stacks and every child stack
+# that invokes one of the functions or bots depends on them.
+#
+# The child templates are written next to the parent template.  Run aws cloudformation package to upload
+# them to S3 before deploying the parent template.
+def write_nested_stacks(template, stack_count, filename):
+    resources = template["Resources"]
+    references, permissions = build_reference_graph(resources)
+    sizes = {name: len(json.dumps(resource, indent=4, default=str)) for name, resource in resources.items()}
+
+    # The pieces of a split component get a stack each, in order, so the stacks never reference each other
+    # in a cycle.  Only the last piece, which nothing else references, is packed with the other components.
+    split_stacks = []
+    units = []
+    for component in find_components(list(references.keys()), references):
+        if len(component) > MAX_STACK_RESOURCES or sum(map(lambda name: sizes[name], component)) > MAX_STACK_TEMPLATE_SIZE:
+            pieces = split_component(component, references, sizes)
+            split_stacks.extend(pieces[:-1])
+            units.append(pieces[-1])
+        else:
+            units.append(component)
+
+    order = {name: index for index, name in enumerate(resources)}
+    stacks = {}
+    packed_stacks = pack_stacks(units, sizes, stack_count - len(split_stacks)) if units else []
+    for index, stack in enumerate(split_stacks + packed_stacks):
+        stacks[f"ContactFlows{index + 1}"] = sorted(stack, key=lambda name: order[name])
+    permission_names = [name for name in resources if name not in references]
+    for index in range(0, len(permission_names), MAX_STACK_RESOURCES):
+        stacks[f"Permissions{index // MAX_STACK_RESOURCES + 1}"] = permission_names[index:index + MAX_STACK_RESOURCES]
+
+    location = {name: stack_name for stack_name, names in stacks.items() for name in names}
+    base_name = os.path.splitext(filename)[0]
+    parent = {
+        "AWSTemplateFormatVersion": template["AWSTemplateFormatVersion"],
+        "Description": template["Description"],
+        "Parameters": template["Parameters"],
+        "Resources": {}
+    }
+    children = {}
+    for stack_name in stacks:
+        children[stack_name] = {
+            "AWSTemplateFormatVersion": template["AWSTemplateFormatVersion"],
+            "Description": f"{template['Description']} - {stack_name}",
+            "Parameters": dict(template["Parameters"]),
+            "Resources": {},
+            "Outputs": {}
+        }
+        parent["Resources"][stack_name] = {
+            "Type": "AWS::CloudFormation::Stack",
+            "Properties": {
+                "TemplateURL": f"{base_name}-{stack_name}.json",
+                "Parameters": {"ConnectInstanceID": {"Ref": "ConnectInstanceID"}}
+            }
+        }
+
+    for stack_name, names in stacks.items():
+        child = children[stack_name]
+        stack_resource = parent["Resources"][stack_name]
+
+        def cross_stack_reference(match):
+            target, attribute = match.group(1), match.group(2)
+            if target not in location or location[target] == stack_name:
+                return match.group(0)
+            owner = location[target]
+            parameter = target + (attribute or "")
+            children[owner]["Outputs"][parameter] = {
+                "Value": {"Fn::GetAtt": [target, attribute]} if attribute else {"Ref": target}
+            }
+            child["Parameters"][parameter] = {"Type": "String"}
+            stack_resource["Properties"]["Parameters"][parameter] = {"Fn::GetAtt": [owner, "Outputs." + parameter]}
+            return "${" + parameter + "}"
+
+        dependencies = set()
+        for name in names:
+            rewrite_sub_strings(resources[name]["Properties"], lambda string: SUB_VARIABLE.sub(cross_stack_reference, string))
+            child["Resources"][name] = resources[name]
+            dependencies.update(map(lambda permission: location[permission], permissions.get(name, set())))
+        if dependencies:
+            stack_resource["DependsOn"] = sorted(dependencies)
+
+    for stack_name, child in children.items():
+        if not child["Outputs"]:
+            del child["Outputs"]
+        print(f"Writing nested stack {stack_name} with {len(child['Resources'])} resources")
+        with open(os.path.join(directory, f"{base_name}-{stack_name}.json"), 'w') as f:
+            json.dump(child, f, indent=4, default=str)
+
+    with open(os.path.join(directory, filename), 'w') as f:
+        json.dump(parent, f, indent=4, default=str)
+
+
+@profiler.profiled("write")
+def write_template(template, filename, nested_stacks):
+    profiler.add_items(len(template["Resources"]))
+    if nested_stacks > 0:
+        write_nested_stacks(template, nested_stacks, filename)
+    else:
+        with open(os.path.join(directory, filename), 'w') as f:
+            json.dump(template, f, indent=4, default=str)
+
+
+# Returns the hash of a resource used to compare it with the previous template.  The resource is compared as it
+# is written to the template, with the keys sorted, and the content of contact flows and modules is parsed so a
+# different order of the keys in the content returned by Connect is not a change.
+def resource_hash(resource):
+    resource = json.loads(json.dumps(resource, default=str))
+    content = _.get(resource, ["Properties", "Content", "Fn::Sub"])
+    if isinstance(content, list) and content and isinstance(content[0], str):
+        try:
+            content[0] = json.loads(content[0])
+        except ValueError:
+            pass
+    return hashlib.sha256(json.dumps(resource, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+# Delta mode compares the template with the previously generated template, resource by resource.  The resources that
+# did not change are copied from the previous template as they are, in their previous order, followed by the added
+# resources, so CloudFormation only sees the resources that changed.
+#
+# Returns the merged template and the delta report.
+@profiler.profiled("delta")
+def merge_previous_template(template, previous_filename):
+    path = os.path.join(directory, previous_filename)
+    previous_resources = {}
+    if os.path.exists(path):
+        with open(path, "r") as file:
+            previous_resources = json.load(file).get("Resources", {})
+    else:
+        print(f"Warning: the previous template {previous_filename} was not found. Every resource is added")
+
+    resources = template["Resources"]
+    report = {"Previous": previous_filename, "Added": [], "Modified": [], "Removed": [], "Unchanged": []}
+    merged = {}
+    for name, previous_resource in previous_resources.items():
+        if name not in resources:
+            report["Removed"].append(name)
+        elif resource_hash(resources[name]) == resource_hash(previous_resource):
+            report["Unchanged"].append(name)
+            merged[name] = previous_resource
+        else:
+            report["Modified"].append(name)
+            merged[name] = resources[name]
+    for name, resource in resources.items():
+        if name not in previous_resources:
+            report["Added"].append(name)
+            merged[name] = resource
+
+    print(f"Delta against {previous_filename}: {len(report['Added'])} added, {len(report['Modified'])} modified, "
+          f"{len(report['Removed'])} removed, {len(report['Unchanged'])} unchanged")
+    return dict(template, Resources=merged), report
+
+
+# The manifest sections of the identifiers in the ARNs of a content that are mapped to the destination instance
+MAPPED_ARN_SECTIONS = {
+    "flow-module": "ContactFlowModulesSummaryList",
+    "prompt": "PromptSummaryList",
+    "queue": "QueueSummaryList"
+}
+
+
+# Returns the function the validator uses to check the identifiers in the ARNs of a content.  An identifier is
+# mapped when it is the identifier of a resource in the manifest file, or is mapped by PhoneNumberMappings.
+def mapped_id_check(destination):
+    mapped = set(re.findall(GUID, " ".join(map(str, destination.phone_number_mappings.values()))))
+    manifest = destination.manifest
+    destination_ids = {}
+
+    def is_mapped(arn_type, id):
+        section = MAPPED_ARN_SECTIONS.get(arn_type)
+        if id in mapped or section is None:
+            return id in mapped
+        if isinstance(manifest, ManifestStore):
+            return manifest.find_by_id(section, id) is not None
+        if section not in destination_ids:
+            destination_ids[section] = {_.get(entry, "Id") for entry in (manifest.get(section) or {}).values()}
+        return id in destination_ids[section]
+
+    return is_mapped
+
+
+# Prints every problem found in a template and stops the export when there is any, before the template is deployed
+def report_problems(problems, filename):
+    if not problems:
+        return
+    print(f"The template {filename} has {len(problems)} problems:")
+    for problem in problems:
+        print(f"  {problem}")
+    raise Exception(f"The template {filename} is not valid, see the problems above. Use --no-validate to write "
+                    "it anyway")
+
+
+# The nested stacks are kept below the limits of a stack by write_nested_stacks, so only the references and the
+# contents are checked
+@profiler.profiled("validate")
+def validate_output(destination):
+    profiler.add_items(len(template["Resources"]))
+    report_problems(validate_template(template, mapped_id_check(destination), limits=nested_stacks == 0),
+                    destination.filename)
+
+
+# Merges the template with the previous template in delta mode, checks it and writes it with its delta report
+def output_template(destination, previous_filename=None):
+    global template
+    filename = destination.filename
+    if delta:
+        template, report = merge_previous_template(template, previous_filename or filename)
+    if validate:
+        validate_output(destination)
+    if delta and write:
+        with open(os.path.join(directory, f"{os.path.splitext(filename)[0]}-delta.json"), 'w') as f:
+            json.dump(report, f, indent=4)
+    if write:
+        write_template(template, filename, nested_stacks)
+    return template
+
+
+# The parameters section of the CloudFormation template
+def template_parameters():
+    return {
+        "ConnectInstanceID": {
+            "Type": "String",
+            "AllowedPattern": ".+",
+            "ConstraintDescription": "ConnectInstanceID is required"
+        }
+    }
+
+
+# The number of describe responses the streaming export reads ahead for every concurrent describe call
+STREAM_READ_AHEAD = 4
+
+# The number of distinct contents the streaming export keeps to rewrite the copies of a content only once
+STREAM_DISTINCT_CONTENTS = 256
+
+# The Lex permissions are added after every contact flow and module, the same as in the complete template
+DEFERRED_RESOURCE_TYPES = ["Custom::ConnectAssociateLex"]
+
+
+# Writes a template one resource at a time.  The file is the same as json.dump(template, indent=4) of the complete
+# template.  The template is written to a temporary file that replaces the template once it is complete, so a
+# failed export does not leave a partial template behind.
+class TemplateWriter:
+    def __init__(self, filename, header, validator=None):
+        self.filename = filename
+        self.path = os.path.join(directory, filename)
+        self.temporary_path = f"{self.path}.tmp"
+        self.file = open(self.temporary_path, "w")
+        self.written = set()
+        self.deferred = {}
+        self.validator = validator
+        self.file.write("{")
+        for key, value in header.items():
+            self.file.write(f"\n    {json.dumps(key)}: {self.dumps(value, 4)},")
+        self.file.write('\n    "Resources": ')
+
+    @staticmethod
+    def dumps(value, indent):
+        return json.dumps(value, indent=4, default=str).replace("\n", "\n" + " " * indent)
+
+    def write_resource(self, name, resource):
+        self.file.write(("," if self.written else "{") + f"\n        {json.dumps(name)}: {self.dumps(resource, 8)}")
+        self.written.add(name)
+        if self.validator is not None:
+            self.validator.check_resource(name, resource)
+
+    # Writes the resources that are not written yet and removes them from resources
+    @profiler.profiled("write")
+    def write(self, resources):
+        profiler.add_items(len(resources))
+        for name, resource in resources.items():
+            if resource["Type"] in DEFERRED_RESOURCE_TYPES:
+                self.deferred[name] = resource
+            elif name not in self.written:
+                self.write_resource(name, resource)
+        resources.clear()
+
+    def close(self, footer):
+        for name, resource in self.deferred.items():
+            self.write_resource(name, resource)
+        self.file.write("\n    }" if self.written else "{}")
+        for key, value in footer.items():
+            self.file.write(f",\n    {json.dumps(key)}: {self.dumps(value, 4)}")
+        self.file.write("\n}")
+        size = self.file.tell()
+        self.file.close()
+        # The template only replaces the previous template when it is valid
+        if self.validator is not None:
+            with profiler.stage("validate"):
+                report_problems(self.validator.finish(_.get(footer, "Parameters", {}), size), self.filename)
+        os.replace(self.temporary_path, self.path)
+
+    def abort(self):
+        self.file.close()
+        os.remove(self.temporary_path)
+
+
+# Describes the summaries in the background and yields each summary with its describe response, in order.  At most
+# STREAM_READ_AHEAD responses per concurrent call are held before the export consumes them.
+def describe_stream(describe, summaries):
+    if describe_cache is not None:
+        describe = describe_cache.cached(describe)
+
+    workers = max(1, concurrency)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for summary in summaries:
+            pending.append((summary, executor.submit(describe, summary)))
+            if len(pending) >= workers * STREAM_READ_AHEAD:
+                yield next_described(pending)
+        while pending:
+            yield next_described(pending)
+
+
+# Waits for the first of the pending describe calls of describe_stream
+@profiler.profiled("describe")
+def next_described(pending):
+    summary, future = pending.popleft()
+    profiler.add_items(1)
+    return summary, future.result()
+
+
+# Returns the ids of the contact flows referenced by a contact flow or module
+def referenced_contact_flow_ids(flow_content):
+    arns = list(map(lambda action: _.get(action, "Parameters.ContactFlowId"), flow_content.actions("TransferToFlow")))
+    arns.extend(map(lambda action: _.get(action, "Parameters.EventHooks.CustomerQueue"),
+                    flow_content.actions("UpdateContactEventHooks")))
+    return [arn.split("/")[-1] for arn in arns if arn is not None]
+
+
+# Runs every replace_* pass on the content of a contact flow or module and sets its content in the template.
+# A content that is already rewritten, a copy of an earlier contact flow or module, is not rewritten again.
+def rewrite_streamed_resource(name, flow_content, destination):
+    if flow_content.serialized is None:
+        with profiler.stage("rewrite"):
+            profiler.add_items(1)
+            for attachment in rewrite_references(name, flow_content, destination):
+                template["Resources"].update(attachment)
+        with profiler.stage("serialize"):
+            flow_content.serialized = flow_content.serialize()
+    template["Resources"][name]["Properties"]["Content"] = {"Fn::Sub": [flow_content.serialized, {}]}
+
+    while len(distinct_flow_contents) > STREAM_DISTINCT_CONTENTS:
+        del distinct_flow_contents[next(iter(distinct_flow_contents))]
+
+
+# The streaming export writes every resource to the template as soon as it is described and rewritten, instead of
+# building the complete template in memory.  The hours of operation, contact flows and modules are each described
+# in the background while the previous ones are rewritten and written.  Only the resource names of the selected
+# resources are kept for the references between them, so the memory does not grow with the size of the contents.
+#
+# The resource names are known from the summaries before any resource is described, so a contact flow can be
+# rewritten before the contact flows it references.  The template is the same as the template of a complete export.
+def stream_template(resource_filter, destination):
+    filename = destination.filename
+    selected = {
+        "HoursOfOperationSummaryList": resource_filter.select(inventory["HoursOfOperationSummaryList"]),
+        "ContactFlowSummaryList": resource_filter.select(inventory["ContactFlowSummaryList"]),
+        "ContactFlowModulesSummaryList": resource_filter.select(inventory["ContactFlowModulesSummaryList"])
+    }
+    for summary in selected["HoursOfOperationSummaryList"]:
+        hours_of_operations[summary["Id"]] = resource_name(summary, "HoursOfOperation")
+    for summary in selected["ContactFlowSummaryList"]:
+        contact_flows[summary["Id"]] = resource_name(summary)
+    for summary in selected["ContactFlowModulesSummaryList"]:
+        contact_flow_modules[summary["Id"]] = resource_name(summary, "Module")
+
+    # The complete template keeps the last of the resources with the same name.  The streamed template can not
+    # replace a resource that is already written.
+    names = list(hours_of_operations.values()) + list(contact_flows.values()) + list(contact_flow_modules.values())
+    duplicates = sorted(name for name, count in Counter(names).items() if count > 1)
+    if duplicates:
+        raise Exception(f"The resource names {', '.join(duplicates)} are used by more than one resource. "
+                        "Export without --stream")
+
+    writer = TemplateWriter(filename, {key: template[key] for key in template if key != "Resources"},
+                            TemplateValidator(mapped_id_check(destination)) if validate else None)
+    try:
+        print("Processing hours of operation")
+        for hours_of_operation, properties in describe_stream(describe_hours_of_operation,
+                                                              selected["HoursOfOperationSummaryList"]):
+            add_hours_of_operation(hours_of_operation, properties, "AWS::Connect::HoursOfOperation")
+            writer.write(template["Resources"])
+
+        # The contact flows that are not published are not exported, so no other resource can reference them
+        print("Retrieving contact flows...")
+        not_exported = {}
+        referencing = {}
+        for contact_flow, properties in describe_stream(describe_contact_flow, selected["ContactFlowSummaryList"]):
+            name = add_contact_flow(contact_flow, properties, "AWS::Connect::ContactFlow")
+            if name is None:
+                not_exported[contact_flow["Id"]] = contact_flow["Name"]
+                continue
+            # Only the content of the resource being written is kept
+            flow_content = flow_contents.pop(name)
+            for contact_flow_id in referenced_contact_flow_ids(flow_content):
+                referencing.setdefault(contact_flow_id, name)
+            rewrite_streamed_resource(name, flow_content, destination)
+            writer.write(template["Resources"])
+
+        print("Retrieving contact flow modules...")
+        for contact_flow_module, properties in describe_stream(describe_contact_flow_module,
+                                                               selected["ContactFlowModulesSummaryList"]):
+            name = add_contact_flow_module(contact_flow_module, properties, "AWS::Connect::ContactFlowModule")
+            flow_content = flow_contents.pop(name)
+            for contact_flow_id in referenced_contact_flow_ids(flow_content):
+                referencing.setdefault(contact_flow_id, name)
+            rewrite_streamed_resource(name, flow_content, destination)
+            writer.write(template["Resources"])
+
+        for contact_flow_id, contact_flow_name in not_exported.items():
+            if contact_flow_id in referencing:
+                raise Exception(f"{referencing[contact_flow_id]} references the contact flow {contact_flow_name} "
+                                "that is not published")
+
+        writer.close({"Parameters": template_parameters()})
+    except BaseException:
+        writer.abort()
+        raise
+
+    print(f"Wrote {len(writer.written)} resources to {filename}")
+
+
+# The sections of the manifest file used to replace the identifiers of the destination instance
+MANIFEST_SECTIONS = ["ContactFlowModulesSummaryList", "LexBotSummaries", "PromptSummaryList", "QueueSummaryList"]
+
+# Manifest and shard files by path, with the modification time of the file when it was read.  A file is only read
+# again when it changes.
+manifests = {}
+
+
+def read_manifest_file(path):
+    modified = os.path.getmtime(path)
+    if path not in manifests or manifests[path][0] != modified:
+        with open(path, "r") as file:
+            manifests[path] = (modified, json.load(file))
+    return manifests[path][1]
+
+
+# Only the sections in MANIFEST_SECTIONS are read, from their shard files when the manifest is sharded.  A SQLite
+# manifest is not read, the resources are looked up when they are referenced.
+def load_manifest(filename):
+    path = os.path.join(directory, filename)
+    if is_store(path):
+        modified = os.path.getmtime(path)
+        if path not in manifests or manifests[path][0] != modified:
+            manifests[path] = (modified, ManifestStore(path))
+        return manifests[path][1]
+    return read_manifest(path, MANIFEST_SECTIONS, read=read_manifest_file)
+
+
+# The destination instance a template is written for: the template file, the manifest file of the destination
+# instance and the PhoneNumberMappings.  The destination stages take it as an argument instead of reading module
+# globals, so the state of one destination is never seen by the export of another.
+class Destination:
+    def __init__(self, filename, manifest_filename, phone_number_mappings):
+        self.filename = filename
+        self.manifest = load_manifest(manifest_filename)
+        self.phone_number_mappings = phone_number_mappings
+        # The phone numbers are replaced in every content with one table, compiled once for the destination
+        self.phone_number_table = SubstitutionTable(phone_number_mappings)
+        # (bot name, alias name) -> the destination bot and alias
+        self.lex_aliases = {}
+        self.lock = threading.Lock()
+
+    # Returns the entry of a resource of the destination instance in the manifest, None when it is not in the
+    # manifest
+    def manifest_entry(self, section, name):
+        if isinstance(self.manifest, ManifestStore):
+            return self.manifest.lookup(section, name)
+        return _.get(self.manifest, [section, name])
+
+    # Returns the destination bot and alias from the manifest file with the same names as the source bot and alias
+    def lex_alias(self, bot_name, alias_name):
+        with self.lock:
+            if (bot_name, alias_name) not in self.lex_aliases:
+                self.lex_aliases[(bot_name, alias_name)] = self.find_lex_alias(bot_name, alias_name)
+            return self.lex_aliases[(bot_name, alias_name)]
+
+    def find_lex_alias(self, bot_name, alias_name):
+        if isinstance(self.manifest, ManifestStore):
+            return self.manifest.lex_alias(bot_name, alias_name)
+        dest_bot = _.get(self.manifest, ["LexBotSummaries", bot_name])
+        dest_alias = list(filter(lambda alias: alias["botAliasName"] == alias_name, dest_bot["botAliases"]))[0]
+        return dest_bot, dest_alias
+
+
+# The ARNs for Connect resources contain account specific information. ie:
+# arn:aws:connect:us-east-1:987654321:contact_flow/...
+#
+# The script replaces the account specific parts with their CloudFormation psuedo parameter equivalents.
+# arn:${AWS::Partition}:connect:${AWS::Region}:${AWS::AccountId}:contact_flow/...
+#
+# The account of an instance does not change, so it is only retrieved once per process.
+@lru_cache(maxsize=None)
+def get_source_account(connect_instance_id):
+    # Get the current account number
+    print("Retrieving information from current account.")
+    identity = get_client("sts").get_caller_identity()
+    account_number = identity["Account"]
+
+    print(f"Current AWS Account {account_number}")
+
+    # Get the current region
+    region = get_current_region()
+
+    print(f"Current region: {region}")
+    print(f"Retrieving resource from connect instance:{connect_instance_id}")
+    connect_arn = get_client('connect', region_name=region, concurrency=concurrency).describe_instance(InstanceId=connect_instance_id)["Instance"]["Arn"]
+
+    # Parse the current partition
+    # For standard AWS Regions, the partition is aws.
+    # For resources in other partitions, the partition is aws-partitionname.
+    # For example, the partition for resources in the China (Beijing and Ningxia) Region is aws-cn
+    # and the partition for resources in the AWS GovCloud (US-West) region is aws-us-gov.
+
+    partition = connect_arn.split(":")[1]
+    print("Current partition {partition}")
+    return account_number, region, partition, connect_arn
+
+
+# The describe cache is opt-in, either with cache_directory or with a Cache section in config.json
+def create_describe_cache(config, cache_directory=None, refresh=False):
+    cache_config = config["Cache"] if "Cache" in config else {}
+    cache_directory = cache_directory or _.get(cache_config, "Directory")
+    if cache_directory is None:
+        return None
+    return DescribeCache(os.path.join(directory, cache_directory),
+                         config["Input"]["ConnectInstanceId"],
+                         max_age=_.get(cache_config, "MaxAgeHours", 24) * 3600,
+                         max_size=_.get(cache_config, "MaxSizeMB", 512) * 1024 * 1024,
+                         refresh=refresh,
+                         without_changes=_.get(cache_config, "WithoutChanges", False))
+
+
+# Exports the source instance in config and returns the template of every output file by file name.
+#   config_directory    - the directory config.json refers to, the current directory by default
+#   concurrency         - number of describe calls to run in parallel
+#   nested_stacks       - split each template into a parent stack and about this many nested stacks
+#   search              - search for the filtered names instead of listing every resource
+#   destination_workers - number of worker processes for the Destinations in config.json
+#   cache_directory     - cache the describe responses in this directory, overrides the Cache section of config.json
+#   use_cache           - False to ignore the describe cache configured in config.json
+#   refresh             - describe every resource again and replace the cached responses
+#   write               - False to return the templates without writing them
+#   delta               - merge each template with the template previously written to its file
+#   previous            - the previous template to merge with instead of Output->Filename, implies delta
+#   stream              - write each resource to the template as soon as it is exported.  The template is not
+#                         returned, its value in the result is None
+#   validate            - False to write the templates without checking their references and limits
+def export_template(config, config_directory=None, concurrency=1, nested_stacks=0, search=True,
+                    destination_workers=None, cache_directory=None, use_cache=True, refresh=False, write=True,
+                    delta=False, previous=None, stream=False, validate=True):
+    global template, client, account_number, region, partition, connect_arn
+    global contact_flows, contact_flow_modules, hours_of_operations, quick_connects, flow_contents
+    global inventory, source_module_names, source_lex_details, describe_cache
+    global distinct_flow_contents, distinct_hours_configs
+    globals().update(config=config, directory=config_directory or os.getcwd(), concurrency=concurrency,
+                     nested_stacks=nested_stacks, write=write, delta=delta or previous is not None, validate=validate)
+
+    # The Lex bots and aliases can change between exports in the same process
+    list_source_bot_names.cache_clear()
+    list_source_bot_aliases.cache_clear()
+
+    describe_cache = create_describe_cache(config, cache_directory, refresh) if use_cache else None
+
+    # The Destinations section of config.json lists several destination instances, each with its own manifest
+    # file, PhoneNumberMappings and output file.  The source instance is exported once for all of them.
+    destinations = config["Destinations"] if "Destinations" in config else []
+
+    # The resources of nested stacks are rewritten with cross-stack references, so they can not be compared with
+    # the resources of a new template
+    if (delta or previous is not None) and nested_stacks > 0:
+        raise Exception("Delta mode can not be used with nested stacks")
+    if previous is not None and destinations:
+        raise Exception("Each destination is compared with its own Filename, a previous template can not be given")
+    # The streaming export writes the resources before the template is complete
+    if stream and (destinations or nested_stacks > 0 or delta or previous is not None or not write):
+        raise Exception("The streaming export can not be used with Destinations, nested stacks or delta mode")
+    # The streaming export selects the resources to export from the inventory, before any of them is described
+    entry_points = _.get(config, "ResourceFilters.EntryPoints")
+    if stream and entry_points is not None:
+        raise Exception("The streaming export can not be used with ResourceFilters->EntryPoints")
+
+    # The manifest file contains mappings of resources and their identifiers from the source
+    # Amazon Connect instance.  This file is created by the create-source-manifest-file.py script
+    #
+    # PhoneNumberMappings tells the script how to replace phone numbers found in the destination instance with
+    # phone numbers found in the source instance.
+    #
+    # With Destinations each destination worker creates its own destination
+    destination = None
+    if not destinations:
+        print("Reading the manifest file to obtain identifiers from destination Connect instance")
+        destination = Destination(config["Output"]["Filename"],
+                                  config["Output"]["ManifestFileName"],
+                                  config["Input"]["PhoneNumberMappings"] if "PhoneNumberMappings" in config["Input"]
+                                  else {})
+
+    template = {
+        "AWSTemplateFormatVersion": "2010-09-09",
+        "Description": config["Output"]["TemplateDescription"],
+        "Resources": {}
+    }
+
+    client = get_client('connect', concurrency=concurrency)
+
+    account_number, region, partition, connect_arn = get_source_account(config["Input"]["ConnectInstanceId"])
+
+    # initialize id -> CF resource name mappings
+    contact_flows = {}
+    contact_flow_modules = {}
+    hours_of_operations = {}
+    quick_connects = {}
+
+    # CF resource name -> parsed content of the exported contact flows and modules
+    flow_contents = {}
+
+    # SHA-256 of the content -> the content shared by the resources with the same content
+    distinct_flow_contents = {}
+    distinct_hours_configs = {}
+
+    # Currently, the script exporting:
+    #   - hours of operation
+    #   - contact flow
+    #   - contact flow modules
+
+
+    connect_arn = replace_pseudo_parms(connect_arn)
+
+    # With EntryPoints every reachable resource is exported, whatever its name
+    resource_filter = ResourceFilter([""] if entry_points is not None else config["ResourceFilters"]["ContactFlows"])
+
+    # Source module id -> name, used to find referenced modules that are not exported in the destination instance
+    source_module_names = {}
+    # Lex alias resource id -> the names of the source bot and alias
+    source_lex_details = {}
+
+    if stream:
+        inventory = list_inventory(resource_filter, search=search, properties=False)
+        source_module_names = {summary["Id"].split("/")[-1]: summary["Name"]
+                               for summary in inventory["ContactFlowModulesSummaryList"]}
+        stream_template(resource_filter, destination)
+        if describe_cache is not None:
+            describe_cache.evict()
+        return {config["Output"]["Filename"]: None}
+
+    # export_quick_connects(resource_filter,"AWS::Connect::QuickConnect")
+    # References to exported contact flows and hours of operation are the same for every destination.  With
+    # Destinations the references to the destination instances are replaced by the destination workers.
+    reachable = find_reachable(entry_points, search) if entry_points is not None else None
+    export_resources(resource_filter, search, destination, reachable=reachable)
+    print_dedup_statistics()
+
+    # Add the parameters section to the CloudFormation template
+    template["Parameters"] = template_parameters()
+
+    templates = {}
+    if not destinations:
+        serialize_flow_contents()
+        templates[destination.filename] = output_template(destination, previous)
+    else:
+        source_export = {
+            "config": config,
+            "directory": directory,
+            "account_number": account_number,
+            "partition": partition,
+            "region": region,
+            "template": template,
+            "flow_contents": flow_contents,
+            "contact_flows": contact_flows,
+            "contact_flow_modules": contact_flow_modules,
+            "hours_of_operations": hours_of_operations,
+            "source_module_names": source_module_names,
+            "source_lex_details": source_lex_details,
+            "nested_stacks": nested_stacks,
+            "write": write,
+            "delta": delta,
+            "validate": validate
+        }
+        # The workers are started with spawn so they do not inherit the boto3 clients and threads of this process
+        # The worker processes are not profiled, the destinations stage is the time spent waiting for them
+        workers = destination_workers or min(len(destinations), os.cpu_count() or 1)
+        with profiler.stage("destinations"), \
+                ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+            futures = list(map(lambda destination: executor.submit(export_destination, source_export, destination),
+                               destinations))
+            for destination, future in zip(destinations, futures):
+                templates[destination["Filename"]] = future.result()
+                profiler.add_items(1)
+                print(f"Created the template {destination['Filename']}")
+
+    if describe_cache is not None:
+        describe_cache.evict()
+
+    return templates
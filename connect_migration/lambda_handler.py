@@ -0,0 +1,106 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import json
+import os
+from connect_migration import clients
+from connect_migration.contact_flow_template import export_template
+from connect_migration.manifest_store import is_store
+from connect_migration.source_manifest import create_manifest, manifest_updated, merge_manifest, parse_sections, \
+    read_json
+
+# AWS Lambda entry point for the manifest and the template exports.  Set the handler of the function to
+# connect_migration.lambda_handler.handler.
+#
+# The clients, the account of the source instance and the manifest files are kept in the modules of
+# connect_migration, so a warm invocation reuses them instead of creating them again.
+#
+# The event:
+#   Action       - "Template" (default) to export the template, or "Manifest" to create the manifest
+#   Config       - the content of config.json.  The config.json file in the deployment package is used by default
+#   Concurrency  - number of describe or list calls to run in parallel
+#   Search       - False to list every resource instead of searching for the filtered names
+#   Validate     - False to return the template without checking its references and limits
+#   Types        - optional, the comma separated resource types of the manifest to list, e.g. "Queue,Prompt".  The
+#                  other sections are kept from the existing manifest, read from the Bucket when it is given and
+#                  from the deployment package otherwise
+#   Bucket       - optional, the S3 bucket the templates or the manifest are written to
+#   Prefix       - optional, the prefix of the S3 keys
+#
+# The manifest files are read from the deployment package, next to config.json.  Use an absolute path under
+# /tmp for the Directory of the Cache section, the deployment package is read only.
+#
+# The Destinations section of config.json is not supported, the worker processes need shared memory that
+# Lambda does not provide.
+#
+# Without a Bucket the templates or the manifest are returned in the response, which is limited to 6 MB.
+
+# The directory of the deployment package
+TASK_ROOT = os.environ.get("LAMBDA_TASK_ROOT", os.getcwd())
+
+
+def load_config(event):
+    if "Config" in event:
+        return event["Config"]
+    with open(os.path.join(TASK_ROOT, "config.json"), "r") as file:
+        return json.load(file)
+
+
+# Returns the existing manifest file, from the bucket when it is given, or None when there is none
+def read_existing_manifest(event, filename):
+    if "Bucket" in event:
+        s3_client = clients.get_client("s3")
+        try:
+            response = s3_client.get_object(Bucket=event["Bucket"], Key=f"{event.get('Prefix', '')}{filename}")
+        except s3_client.exceptions.NoSuchKey:
+            return None
+        return json.loads(response["Body"].read())
+    path = os.path.join(TASK_ROOT, filename)
+    return read_json(path) if os.path.exists(path) else None
+
+
+def put_objects(bucket, prefix, objects):
+    s3_client = clients.get_client("s3")
+    keys = []
+    for filename, content in objects.items():
+        key = f"{prefix}{filename}"
+        s3_client.put_object(Bucket=bucket, Key=key, Body=json.dumps(content, indent=4, default=str).encode("utf-8"))
+        keys.append(key)
+    return keys
+
+
+def handler(event, context):
+    config = load_config(event)
+    clients.configure(config)
+    clients.telemetry.reset()
+
+    if event.get("Action", "Template") == "Manifest":
+        filename = config["Output"]["ManifestFileName"]
+        existing = {}
+        sections = None
+        if "Types" in event:
+            # The sections that are not listed again are merged from the existing manifest file, so it must exist
+            existing = None if is_store(filename) else read_existing_manifest(event, filename)
+            if existing is None:
+                raise Exception(f"Types needs an existing {filename} manifest file to merge the listed sections into")
+            sections = parse_sections(event["Types"])
+        mapping, statistics = create_manifest(config, concurrency=event.get("Concurrency", 10), sections=sections)
+        objects = {filename: merge_manifest(existing, mapping, manifest_updated())}
+        response = {"Statistics": statistics}
+    else:
+        if "Destinations" in config:
+            raise Exception("The Destinations section of config.json is not supported in Lambda")
+        objects = export_template(config,
+                                  config_directory=TASK_ROOT,
+                                  concurrency=event.get("Concurrency", 1),
+                                  search=event.get("Search", True),
+                                  write=False,
+                                  validate=event.get("Validate", True))
+        response = {}
+
+    if "Bucket" in event:
+        response["Keys"] = put_objects(event["Bucket"], event.get("Prefix", ""), objects)
+    else:
+        response["Files"] = objects
+    response["Telemetry"] = clients.telemetry.report()
+    return response
@@ -0,0 +1,154 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import json
+import os
+import sqlite3
+import threading
+from functools import lru_cache
+
+# A manifest in a SQLite file instead of a JSON file.  The manifest is written to SQLite when ManifestFileName
+# ends with one of SQLITE_EXTENSIONS, e.g. source-manifest.db.  The export looks up the resources it references
+# by name with an indexed query, so the manifest is never loaded as a whole.
+#
+# The tables:
+#   sections    - when each section of the manifest was listed and its number of items
+#   resources   - every resource by section and name, e.g. (QueueSummaryList, Queue1), with its identifier, ARN
+#                 and the entry of the JSON manifest.  Indexed by (section, name) and (section, id)
+#   bot_aliases - the aliases of the Lex bots of LexBotSummaries, indexed by (bot name, alias name)
+#
+# The file can be queried by other tools as well, e.g.
+#   sqlite3 source-manifest.db "select id from resources where section = 'QueueSummaryList' and name = 'Queue1'"
+
+SQLITE_EXTENSIONS = (".db", ".sqlite", ".sqlite3")
+
+# The section of the Lex V2 bots, its aliases are kept in bot_aliases
+LEX_SECTION = "LexBotSummaries"
+
+# The number of lookups kept by each ManifestStore
+LOOKUP_CACHE_SIZE = 4096
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sections (
+    section TEXT PRIMARY KEY,
+    updated TEXT,
+    items INTEGER
+);
+CREATE TABLE IF NOT EXISTS resources (
+    section TEXT NOT NULL,
+    name TEXT NOT NULL,
+    id TEXT,
+    arn TEXT,
+    entry TEXT NOT NULL,
+    PRIMARY KEY (section, name)
+);
+CREATE INDEX IF NOT EXISTS resources_by_id ON resources (section, id);
+CREATE TABLE IF NOT EXISTS bot_aliases (
+    bot_name TEXT NOT NULL,
+    alias_name TEXT NOT NULL,
+    alias_id TEXT NOT NULL,
+    PRIMARY KEY (bot_name, alias_name)
+);
+"""
+
+
+def is_store(path):
+    return path.lower().endswith(SQLITE_EXTENSIONS)
+
+
+# Returns the identifier and ARN of an entry of the JSON manifest.  The entries of HoursOfOperationSummaryList are
+# only the ARN.
+def entry_columns(section, entry):
+    if section == LEX_SECTION:
+        return entry["botId"], None
+    if isinstance(entry, dict):
+        return entry.get("Id"), entry.get("Arn")
+    return None, entry
+
+
+# Writes the sections in mapping to the SQLite manifest at path.  The rows of each section are replaced, the
+# sections that are not in mapping are kept.
+def write_store(path, mapping, updated):
+    connection = sqlite3.connect(path)
+    try:
+        with connection:
+            connection.executescript(SCHEMA)
+            for section, entries in mapping.items():
+                connection.execute("DELETE FROM resources WHERE section = ?", (section,))
+                connection.executemany(
+                    "INSERT OR REPLACE INTO resources (section, name, id, arn, entry) VALUES (?, ?, ?, ?, ?)",
+                    [(section, name) + entry_columns(section, entry) + (json.dumps(entry, default=str),)
+                     for name, entry in entries.items()
+                     if section != LEX_SECTION])
+                if section == LEX_SECTION:
+                    connection.execute("DELETE FROM bot_aliases")
+                    connection.executemany(
+                        "INSERT OR REPLACE INTO resources (section, name, id, arn, entry) VALUES (?, ?, ?, NULL, ?)",
+                        [(section, name, bot["botId"], json.dumps({"botId": bot["botId"], "botName": bot["botName"]}))
+                         for name, bot in entries.items()])
+                    connection.executemany(
+                        "INSERT OR REPLACE INTO bot_aliases (bot_name, alias_name, alias_id) VALUES (?, ?, ?)",
+                        [(name, alias["botAliasName"], alias["botAliasId"])
+                         for name, bot in entries.items()
+                         for alias in bot["botAliases"]])
+                connection.execute("INSERT OR REPLACE INTO sections (section, updated, items) VALUES (?, ?, ?)",
+                                   (section, updated, len(entries)))
+    finally:
+        connection.close()
+
+
+# Reads a SQLite manifest.  The connection is opened read only the first time it is needed and is shared by the
+# threads of the export.
+class ManifestStore:
+
+    def __init__(self, path):
+        if not os.path.exists(path):
+            raise Exception(f"The manifest file {path} does not exist")
+        self.path = path
+        self.connection = None
+        self.lock = threading.Lock()
+        self.lookup = lru_cache(maxsize=LOOKUP_CACHE_SIZE)(self.query_entry)
+        self.lex_alias = lru_cache(maxsize=LOOKUP_CACHE_SIZE)(self.query_lex_alias)
+
+    def query(self, sql, parameters=()):
+        with self.lock:
+            if self.connection is None:
+                self.connection = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, check_same_thread=False)
+            return self.connection.execute(sql, parameters).fetchall()
+
+    # Returns the entry of a resource by name as in the JSON manifest, None when the manifest has no such resource
+    def query_entry(self, section, name):
+        rows = self.query("SELECT entry FROM resources WHERE section = ? AND name = ?", (section, name))
+        return json.loads(rows[0][0]) if rows else None
+
+    # Returns the name and entry of a resource by identifier, None when the manifest has no such resource
+    def find_by_id(self, section, id):
+        rows = self.query("SELECT name, entry FROM resources WHERE section = ? AND id = ?", (section, id))
+        return (rows[0][0], json.loads(rows[0][1])) if rows else None
+
+    # Returns the bot and the alias with the given names as in the JSON manifest
+    def query_lex_alias(self, bot_name, alias_name):
+        bot = self.lookup(LEX_SECTION, bot_name)
+        rows = self.query("SELECT alias_id FROM bot_aliases WHERE bot_name = ? AND alias_name = ?",
+                          (bot_name, alias_name))
+        if bot is None or not rows:
+            raise Exception(f"The Lex bot {bot_name} with the alias {alias_name} was not found in the manifest file")
+        return bot, {"botAliasId": rows[0][0], "botAliasName": alias_name}
+
+    # Returns a whole section as in the JSON manifest
+    def section(self, section):
+        entries = {name: json.loads(entry)
+                   for name, entry in self.query("SELECT name, entry FROM resources WHERE section = ? ORDER BY rowid",
+                                                 (section,))}
+        if section == LEX_SECTION:
+            for bot in entries.values():
+                bot["botAliases"] = []
+            for bot_name, alias_name, alias_id in self.query("SELECT bot_name, alias_name, alias_id FROM bot_aliases "
+                                                             "ORDER BY rowid"):
+                entries[bot_name]["botAliases"].append({"botAliasId": alias_id, "botAliasName": alias_name})
+        return entries
+
+    # Returns when each section was listed and its number of items, as ManifestSections of the JSON manifest
+    def sections(self):
+        return {section: {"Updated": updated, "Items": items}
+                for section, updated, items in self.query("SELECT section, updated, items FROM sections")}
@@ -0,0 +1,151 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import cProfile
+import functools
+import threading
+import time
+import tracemalloc
+
+# Records the time and memory of the stages of the scripts, e.g. describing the contact flows or one of the
+# replace_* passes.  The profiler is off unless --profile-stages is given, then every stage records
+#   calls     - the number of times the stage ran
+#   items     - the number of resources the stage processed, counted with add_items().  - when the stage does
+#               not count them
+#   seconds   - the wall time of the stage
+#   net MB    - the memory allocated by the stage that was still allocated when it ended, as traced by tracemalloc
+#   peak MB   - the highest memory traced while the stage ran, including the memory allocated before it
+#
+# Stages can be nested, e.g. attach_lambdas runs while a contact flow is added.  The time and memory of the inner
+# stage are included in the outer stage as well.  The memory is traced for the whole process, so the allocations of
+# worker threads are included in the stage that waits for them.
+#
+# tracemalloc slows down the scripts, so the times are only comparable between profiled runs.
+
+MEGABYTE = 1024 * 1024
+
+
+class Stage:
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+        self.peak = 0
+
+    def __enter__(self):
+        stack = self.profiler.stack()
+        current, peak = tracemalloc.get_traced_memory()
+        # The peak is reset for this stage, so the outer stage keeps the peak it had so far
+        if stack:
+            stack[-1].peak = max(stack[-1].peak, peak)
+        self.profiler.peak = max(self.profiler.peak, peak)
+        tracemalloc.reset_peak()
+        # The stages are reported in the order they first started
+        with self.profiler.lock:
+            self.profiler.entry(self.name)
+        stack.append(self)
+        self.current = current
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        seconds = time.perf_counter() - self.start
+        current, peak = tracemalloc.get_traced_memory()
+        self.peak = max(self.peak, peak)
+        stack = self.profiler.stack()
+        stack.pop()
+        if stack:
+            stack[-1].peak = max(stack[-1].peak, self.peak)
+        self.profiler.record(self.name, seconds, current - self.current, self.peak)
+
+
+class Profiler:
+
+    def __init__(self):
+        self.enabled = False
+        self.stages = {}
+        # The highest memory traced before the last reset of the tracemalloc peak
+        self.peak = 0
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.cprofile = None
+
+    # Starts tracing the memory, and with dump_filename the cProfile profiler of the main thread
+    def start(self, dump_filename=None):
+        self.enabled = True
+        self.dump_filename = dump_filename
+        tracemalloc.start()
+        if dump_filename is not None:
+            self.cprofile = cProfile.Profile()
+            self.cprofile.enable()
+
+    def stack(self):
+        if not hasattr(self.local, "stack"):
+            self.local.stack = []
+        return self.local.stack
+
+    def stage(self, name):
+        return Stage(self, name) if self.enabled else NO_STAGE
+
+    # Decorates a function that runs as a stage, e.g. @profiler.profiled("attach_lambdas")
+    def profiled(self, name):
+        def decorator(function):
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return function(*args, **kwargs)
+                with Stage(self, name):
+                    return function(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    # Counts the resources processed by the current stage of the thread
+    def add_items(self, count):
+        if self.enabled and self.stack():
+            with self.lock:
+                self.entry(self.stack()[-1].name)["items"] += count
+
+    def entry(self, name):
+        if name not in self.stages:
+            self.stages[name] = {"calls": 0, "items": 0, "seconds": 0, "net": 0, "peak": 0}
+        return self.stages[name]
+
+    def record(self, name, seconds, net, peak):
+        with self.lock:
+            stage = self.entry(name)
+            stage["calls"] += 1
+            stage["seconds"] += seconds
+            stage["net"] += net
+            stage["peak"] = max(stage["peak"], peak)
+
+    def print_report(self):
+        if not self.enabled:
+            return
+        if self.cprofile is not None:
+            self.cprofile.disable()
+            self.cprofile.dump_stats(self.dump_filename)
+        print(f"{'Stage':<32}{'Calls':>8}{'Items':>8}{'Seconds':>10}{'Net MB':>9}{'Peak MB':>9}")
+        with self.lock:
+            for name, stage in self.stages.items():
+                items = stage["items"] if stage["items"] else "-"
+                print(f"{name:<32}{stage['calls']:>8}{items:>8}{stage['seconds']:>10.3f}"
+                      f"{stage['net'] / MEGABYTE:>9.1f}{stage['peak'] / MEGABYTE:>9.1f}")
+        peak = max(self.peak, tracemalloc.get_traced_memory()[1])
+        print(f"Peak memory traced: {peak / MEGABYTE:.1f} MB")
+        if self.cprofile is not None:
+            print(f"cProfile statistics written to {self.dump_filename}")
+
+
+class NoStage:
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+
+NO_STAGE = NoStage()
+
+# The profiler shared by every module
+profiler = Profiler()
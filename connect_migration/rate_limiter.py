@@ -0,0 +1,119 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import threading
+import time
+from connect_migration.telemetry import THROTTLING_ERROR_CODES
+
+# Limits the rate of the API calls of every instrumented boto3 client with a token bucket per operation,
+# e.g. connect.DescribeContactFlow.  The clients share the buckets, so the limit applies to the whole script
+# no matter how many threads or clients call an operation.
+#
+# The limiter is off until it is enabled, e.g. with --rate-limit or a RateLimits section in config.json.  Without
+# it the calls rely on the retries of botocore when they are throttled.
+#
+# Every attempt, including the retries made by botocore, takes a token before it is sent.  A throttled attempt
+# halves the rate of its operation and every successful call adds back a twentieth of the configured rate, until
+# the operation is back at its configured rate.
+#
+# The limits are configured per service or per operation.  An operation limit takes precedence over the limit
+# of its service.
+#   Rate  - requests per second
+#   Burst - the number of requests that can be sent at once after the operation has been idle
+#
+# Amazon Connect allows 2 requests per second with a burst of 5 for most of its APIs.  The Lex V2 and STS limits
+# are conservative defaults.  Check the Service Quotas console for the quotas of your account.
+DEFAULT_RATE_LIMITS = {
+    "connect": {"Rate": 2, "Burst": 5},
+    "lex-models-v2": {"Rate": 5, "Burst": 10},
+    "sts": {"Rate": 20, "Burst": 20}
+}
+
+# The limit for the operations of a service without a configured limit
+DEFAULT_RATE_LIMIT = {"Rate": 5, "Burst": 5}
+
+# The rate of an operation is never reduced below this many requests per second
+MIN_RATE = 0.1
+
+
+class TokenBucket:
+
+    def __init__(self, rate, burst):
+        self.max_rate = rate
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    # Takes a token and waits until it is available.  The tokens are handed out in the order they were
+    # requested, a caller that has to wait reserves its token so the callers after it wait longer.
+    def acquire(self):
+        with self.lock:
+            self.refill()
+            self.tokens -= 1
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    def throttled(self):
+        with self.lock:
+            self.refill()
+            self.rate = max(MIN_RATE, self.rate / 2)
+            self.tokens = min(self.tokens, 0)
+
+    def succeeded(self):
+        with self.lock:
+            if self.rate < self.max_rate:
+                self.refill()
+                self.rate = min(self.max_rate, self.rate + self.max_rate / 20)
+
+
+class RateLimiter:
+
+    def __init__(self, limits=None):
+        self.enabled = False
+        self.buckets = {}
+        self.lock = threading.Lock()
+        self.configure(limits)
+
+    # Replaces the configured limits.  The buckets are created again with the new limits.
+    def configure(self, limits=None):
+        with self.lock:
+            self.limits = dict(DEFAULT_RATE_LIMITS)
+            self.limits.update(limits or {})
+            self.buckets = {}
+
+    def instrument(self, client):
+        client.meta.events.register("before-send", self.before_send)
+        client.meta.events.register("needs-retry", self.needs_retry)
+        client.meta.events.register("after-call", self.after_call)
+        return client
+
+    # The event names end with <service>.<operation>, e.g. before-send.connect.DescribeContactFlow
+    def bucket(self, event_name):
+        service, operation = event_name.split(".")[1:3]
+        name = f"{service}.{operation}"
+        with self.lock:
+            if name not in self.buckets:
+                limit = self.limits.get(name, self.limits.get(service, DEFAULT_RATE_LIMIT))
+                self.buckets[name] = TokenBucket(limit["Rate"], limit["Burst"])
+            return self.buckets[name]
+
+    def before_send(self, event_name, **kwargs):
+        if self.enabled:
+            self.bucket(event_name).acquire()
+
+    def needs_retry(self, event_name, response=None, **kwargs):
+        if self.enabled and response is not None and response[1].get("Error", {}).get("Code") in THROTTLING_ERROR_CODES:
+            self.bucket(event_name).throttled()
+
+    def after_call(self, event_name, parsed, **kwargs):
+        if self.enabled and "Error" not in parsed:
+            self.bucket(event_name).succeeded()
@@ -0,0 +1,82 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import copy
+import gzip
+import json
+import threading
+from botocore.awsrequest import AWSResponse
+
+# Records the responses of the API calls of an export to a snapshot file, and replays them in a later export
+# without calling AWS.  With --record every call of the source instance is saved, e.g. the list and search pages,
+# the describe calls, describe_instance and get_caller_identity.  With --replay the template is created again from
+# the snapshot and the manifest file, e.g. to try other PhoneNumberMappings, without the network or credentials.
+#
+# The clients are instrumented with the botocore client events:
+#   before-parameter-build - the operation and its parameters are the key of the response
+#   after-call             - records the response, error responses included
+#   before-call            - returns the recorded response instead of sending the request
+#
+# The snapshot is gzip compressed JSON:
+#   Region    - the region of the recorded clients, used by the replayed clients
+#   Responses - "<service>.<operation> <parameters as JSON>" -> the status code and the response without its
+#               ResponseMetadata
+#
+# A replayed call must have the same parameters as the recorded call.  The search APIs are called with the names
+# of the resource filters, so record with --no-search to replay with other resource filters.
+
+RECORD = "record"
+REPLAY = "replay"
+
+
+class Snapshot:
+
+    def __init__(self, path, mode):
+        self.path = path
+        self.mode = mode
+        self.region = None
+        self.responses = {}
+        self.lock = threading.Lock()
+        if mode == REPLAY:
+            with gzip.open(path, "rt", encoding="utf-8") as file:
+                snapshot = json.load(file)
+            self.region = snapshot["Region"]
+            self.responses = snapshot["Responses"]
+
+    def instrument(self, client):
+        client.meta.events.register("before-parameter-build", self.before_parameter_build)
+        if self.mode == RECORD:
+            client.meta.events.register("after-call", self.after_call)
+        else:
+            client.meta.events.register("before-call", self.before_call)
+        return client
+
+    def before_parameter_build(self, params, model, context, **kwargs):
+        context["snapshot_key"] = f"{model.service_model.service_name}.{model.name} " + \
+            json.dumps(params, sort_keys=True, default=str)
+
+    def after_call(self, http_response, parsed, context, **kwargs):
+        response = {key: value for key, value in parsed.items() if key != "ResponseMetadata"}
+        with self.lock:
+            self.responses[context["snapshot_key"]] = {
+                "StatusCode": http_response.status_code,
+                "Response": json.loads(json.dumps(response, default=str))
+            }
+
+    def before_call(self, context, **kwargs):
+        key = context["snapshot_key"]
+        if key not in self.responses:
+            raise Exception(f"The snapshot {self.path} has no response for {key}. Record the snapshot again with "
+                            "the same options, or with --no-search to replay other resource filters")
+        recorded = self.responses[key]
+        # The export changes the responses it receives, so every replayed call gets its own copy
+        return AWSResponse(None, recorded["StatusCode"], {}, None), copy.deepcopy(recorded["Response"])
+
+    def save(self, region):
+        with self.lock:
+            snapshot = {"Region": region, "Responses": dict(sorted(self.responses.items()))}
+        # The file name and modification time are left out of the gzip header, so the same responses give the
+        # same file
+        with open(self.path, "wb") as raw, gzip.GzipFile(filename="", fileobj=raw, mode="wb", mtime=0) as file:
+            file.write(json.dumps(snapshot, indent=1).encode("utf-8"))
+        print(f"Recorded {len(snapshot['Responses'])} API responses to {self.path}")
@@ -0,0 +1,314 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+import pydash as _
+from connect_migration.clients import get_client
+from connect_migration.manifest_store import ManifestStore, is_store, write_store
+from connect_migration.profiler import profiler
+
+# Creates the manifest of the resources in a Connect instance.  create-source-manifest-file.py runs
+# create_manifest with the options of its command line and writes the manifest file with write_manifest.
+#
+# The manifest has a section per resource type, e.g. QueueSummaryList.  Every section is also written to its own
+# shard file in a directory named after the manifest file, e.g. source-manifest/QueueSummaryList.json, so a section
+# can be listed again and read without the other sections.  ManifestSections in the manifest file records when
+# each section was listed.
+#
+# A ManifestFileName ending with .db, .sqlite or .sqlite3 is written to a SQLite file instead, see manifest_store.py.
+
+# The largest page size allowed by the Connect and Lex V2 list APIs
+MAX_PAGE_SIZE = 1000
+
+# The Connect resource types written to the manifest file.
+#   name      - the name of the resource type for --types
+#   key       - the section of the manifest file
+#   operation - the Connect list API used to retrieve the summaries
+#   arguments - additional arguments for the list API
+#   entry     - returns the name and the value recorded in the manifest for a summary.
+#               Summaries without a name are skipped
+RESOURCE_TYPES = [
+    {
+        "name": "ContactFlowModule",
+        "key": "ContactFlowModulesSummaryList",
+        "operation": "list_contact_flow_modules",
+        "arguments": {"ContactFlowModuleState": "active"},
+        "entry": lambda summary: (summary["Name"], {"Arn": summary["Arn"], "Id": summary["Id"]})
+    },
+    {
+        "name": "ContactFlow",
+        "key": "ContactFlowSummaryList",
+        "operation": "list_contact_flows",
+        "arguments": {"ContactFlowTypes": ['CONTACT_FLOW',
+                                           'CUSTOMER_QUEUE',
+                                           'CUSTOMER_HOLD',
+                                           'CUSTOMER_WHISPER',
+                                           'AGENT_HOLD',
+                                           'AGENT_WHISPER',
+                                           'OUTBOUND_WHISPER',
+                                           'AGENT_TRANSFER',
+                                           'QUEUE_TRANSFER']},
+        "entry": lambda summary: (summary["Name"], {"Arn": summary["Arn"], "Id": summary["Id"]})
+    },
+    {
+        "name": "HoursOfOperation",
+        "key": "HoursOfOperationSummaryList",
+        "operation": "list_hours_of_operations",
+        "arguments": {},
+        "entry": lambda summary: (summary["Name"], summary["Arn"])
+    },
+    {
+        "name": "PhoneNumber",
+        "key": "PhoneNumberSummaryList",
+        "operation": "list_phone_numbers",
+        "arguments": {"PhoneNumberTypes": ["TOLL_FREE", "DID"]},
+        "entry": lambda summary: (summary["PhoneNumber"], {"Arn": summary["Arn"], "Name": summary["PhoneNumber"]})
+    },
+    {
+        "name": "Prompt",
+        "key": "PromptSummaryList",
+        "operation": "list_prompts",
+        "arguments": {},
+        "entry": lambda summary: (summary["Name"], {"Arn": summary["Arn"], "Id": summary["Id"]})
+    },
+    {
+        "name": "Queue",
+        "key": "QueueSummaryList",
+        "operation": "list_queues",
+        "arguments": {"QueueTypes": ["STANDARD", "AGENT"]},
+        "entry": lambda summary: (_.get(summary, "Name"), {"Arn": summary["Arn"], "Id": _.get(summary, "Id")})
+    },
+    {
+        "name": "QuickConnect",
+        "key": "QuickConnectSummaryList",
+        "operation": "list_quick_connects",
+        "arguments": {"QuickConnectTypes": ["USER", "QUEUE", "PHONE_NUMBER"]},
+        "entry": lambda summary: (summary["Name"], {"Arn": summary["Arn"], "Id": summary["Id"]})
+    },
+    {
+        "name": "RoutingProfile",
+        "key": "RoutingProfileSummaryList",
+        "operation": "list_routing_profiles",
+        "arguments": {},
+        "entry": lambda summary: (summary["Name"], {"Arn": summary["Arn"], "Id": summary["Id"]})
+    }
+]
+
+
+# The section of the Lex V2 bots and their aliases
+LEX_SECTION = "LexBotSummaries"
+
+# The resource type names for --types -> the section of the manifest file, in the order of the manifest file
+SECTIONS = dict([(resource_type["name"], resource_type["key"]) for resource_type in RESOURCE_TYPES] +
+                [("LexBot", LEX_SECTION)])
+
+
+# Returns the sections of a comma separated list of resource type names, e.g. Queue,Prompt
+def parse_sections(types):
+    names = [name.strip() for name in types.split(",") if name.strip()]
+    unknown = [name for name in names if name not in SECTIONS]
+    if unknown:
+        raise Exception(f"Unknown resource types {', '.join(unknown)}. Use one of {', '.join(SECTIONS)}")
+    return [SECTIONS[name] for name in names]
+
+
+# Each worker thread needs its own connection when the list calls are run in parallel
+def get_connect_client(concurrency):
+    return get_client('connect', concurrency=concurrency)
+
+
+def get_lexv2_client(concurrency):
+    return get_client('lexv2-models', concurrency=concurrency)
+
+
+# Lists every page of a Connect resource type and returns the manifest section with its statistics
+def list_resource_type(resource_type, instance_id, concurrency):
+    start = time.perf_counter()
+    section = {}
+    pages = 0
+    paginator = get_connect_client(concurrency).get_paginator(resource_type["operation"])
+    for page in paginator.paginate(InstanceId=instance_id,
+                                   PaginationConfig={
+                                                     "PageSize": MAX_PAGE_SIZE,
+                                    },
+                                   **resource_type["arguments"]):
+        pages += 1
+        for summary in page[resource_type["key"]]:
+            name, value = resource_type["entry"](summary)
+            if name is None:
+                continue
+            section[name] = value
+
+    return section, {"items": len(section), "pages": pages, "seconds": time.perf_counter() - start}
+
+
+def list_bots(concurrency):
+    lexv2_client = get_lexv2_client(concurrency)
+    bot_definitions = {}
+    pages = 0
+    response = lexv2_client.list_bots(maxResults=MAX_PAGE_SIZE)
+    while(True):
+        pages += 1
+        for bot_definition in response["botSummaries"]:
+            bot_definitions[bot_definition["botName"]] = {
+                "botId": bot_definition["botId"],
+                "botName": bot_definition["botName"],
+                "botAliases": []
+            }
+        if "nextToken" not in response:
+            break
+        response = lexv2_client.list_bots(maxResults=MAX_PAGE_SIZE, nextToken=response["nextToken"])
+    return bot_definitions, pages
+
+
+def list_bot_aliases(bot_id, concurrency):
+    lexv2_client = get_lexv2_client(concurrency)
+    bot_aliases = []
+    pages = 0
+    response = lexv2_client.list_bot_aliases(botId=bot_id, maxResults=MAX_PAGE_SIZE)
+    while(True):
+        pages += 1
+        for bot_alias in response["botAliasSummaries"]:
+            bot_aliases.append({
+                "botAliasId": bot_alias["botAliasId"],
+                "botAliasName": bot_alias["botAliasName"]
+            })
+        if "nextToken" not in response:
+            break
+        response = lexv2_client.list_bot_aliases(botId=bot_id,
+                                                 maxResults=MAX_PAGE_SIZE,
+                                                 nextToken=response["nextToken"])
+    return bot_aliases, pages
+
+
+# Lists the Connect resource types and the Lex V2 bots of the instance in config at the same time.  Once the
+# bots are known the aliases of every bot are listed in parallel.  The sections are added to the manifest in a
+# fixed order so the file is the same regardless of which listing finishes first.
+#
+# Only the given sections are listed, every section by default.
+#
+# Returns the manifest and the items, pages and seconds spent listing each section of the manifest.
+def create_manifest(config, concurrency=10, sections=None):
+    sections = sections or list(SECTIONS.values())
+    resource_types = [resource_type for resource_type in RESOURCE_TYPES if resource_type["key"] in sections]
+    instance_id = config["Output"]["ConnectInstanceId"]
+    mapping = {}
+    statistics = {}
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+        futures = list(map(lambda resource_type: executor.submit(list_resource_type, resource_type, instance_id,
+                                                                 concurrency),
+                           resource_types))
+
+        bot_definitions = None
+        start = time.perf_counter()
+        with profiler.stage("list Lex bots"):
+            if LEX_SECTION in sections:
+                bot_definitions, bot_pages = executor.submit(list_bots, concurrency).result()
+                alias_futures = {bot_name: executor.submit(list_bot_aliases, bot_definitions[bot_name]["botId"],
+                                                           concurrency)
+                                 for bot_name in bot_definitions}
+                alias_pages = 0
+                for bot_name, future in alias_futures.items():
+                    bot_aliases, pages = future.result()
+                    bot_definitions[bot_name]["botAliases"] = bot_aliases
+                    alias_pages += pages
+                profiler.add_items(len(bot_definitions))
+                lex_statistics = {
+                    "items": len(bot_definitions),
+                    "pages": bot_pages + alias_pages,
+                    "seconds": time.perf_counter() - start
+                }
+
+        # The resource types are listed while the Lex bots are listed, so this stage is only the remaining wait
+        with profiler.stage("list resource types"):
+            for resource_type, future in zip(resource_types, futures):
+                mapping[resource_type["key"]], statistics[resource_type["key"]] = future.result()
+                profiler.add_items(statistics[resource_type["key"]]["items"])
+
+    if bot_definitions is not None:
+        mapping[LEX_SECTION] = bot_definitions
+        statistics[LEX_SECTION] = lex_statistics
+    return mapping, statistics
+
+
+def shard_path(path, section):
+    return os.path.join(os.path.splitext(path)[0], f"{section}.json")
+
+
+def read_json(path):
+    with open(path, "r") as file:
+        return json.load(file)
+
+
+# Returns the sections of the manifest file at path, every section by default.  A section is read from its shard
+# file when there is one, so the manifest file is only read for the sections without a shard, e.g. in manifest
+# files written before the sections were sharded.
+def read_manifest(path, sections=None, read=read_json):
+    if is_store(path):
+        store = ManifestStore(path)
+        return {section: store.section(section) for section in sections or SECTIONS.values()}
+    if sections is None:
+        return read(path)
+    manifest = {}
+    complete = None
+    for section in sections:
+        if os.path.exists(shard_path(path, section)):
+            manifest[section] = read(shard_path(path, section))["Section"]
+        else:
+            complete = complete if complete is not None else read(path)
+            if section in complete:
+                manifest[section] = complete[section]
+    return manifest
+
+
+# Returns the existing manifest with the sections in mapping replaced.  The sections that are not in mapping are
+# kept, so a refresh of some of the sections is merged into the manifest.  ManifestSections records when each
+# section was listed.
+def merge_manifest(existing, mapping, updated):
+    existing = dict(existing)
+    sections = dict(existing.pop("ManifestSections", {}))
+    merged = dict(existing, **mapping)
+    for section in mapping:
+        sections[section] = {"Updated": updated, "Items": len(mapping[section])}
+
+    manifest = {section: merged[section] for section in SECTIONS.values() if section in merged}
+    manifest.update(merged)
+    manifest["ManifestSections"] = {section: sections[section] for section in manifest if section in sections}
+    return manifest
+
+
+def manifest_updated():
+    return datetime.now(timezone.utc).isoformat(timespec="seconds")
+
+
+# Writes the sections in mapping to the manifest file at path and to their shard files.  The sections that are
+# not in mapping are kept from the existing manifest file.
+def write_manifest(path, mapping):
+    updated = manifest_updated()
+    if is_store(path):
+        write_store(path, mapping, updated)
+        return
+    manifest = merge_manifest(read_json(path) if os.path.exists(path) else {}, mapping, updated)
+    sections = manifest["ManifestSections"]
+
+    os.makedirs(os.path.splitext(path)[0], exist_ok=True)
+    for section in manifest:
+        if section == "ManifestSections":
+            continue
+        # The sections of a manifest file written before the sections were sharded get a shard as well
+        if section in mapping or not os.path.exists(shard_path(path, section)):
+            with open(shard_path(path, section), "w") as file:
+                json.dump({"Updated": _.get(sections, [section, "Updated"]), "Section": manifest[section]}, file,
+                          indent=4, default=str)
+    with open(path, "w") as file:
+        json.dump(manifest, file, indent=4, default=str)
+
+
+def print_statistics(statistics):
+    print(f"{'Resource type':<32}{'Items':>8}{'Pages':>8}{'Seconds':>10}")
+    for key, values in statistics.items():
+        print(f"{key:<32}{values['items']:>8}{values['pages']:>8}{values['seconds']:>10.2f}")
@@ -0,0 +1,109 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import heapq
+import itertools
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+# Runs a graph of tasks on a pool of worker threads.  A task starts as soon as every task it depends on has
+# finished, instead of waiting for a whole stage of the export to finish.
+#
+# Every task has
+#   name         - any hashable value, e.g. ("describe", "ContactFlowSummaryList", 3)
+#   function     - called without arguments, the result is kept in results by the name of the task
+#   dependencies - the names of the tasks that must finish first.  A dependency can be added after the task that
+#                  depends on it, e.g. by a task that only knows the resources once they are listed
+#   kind         - the kinds in limits are limited to a number of tasks running at the same time, e.g. the
+#                  describe calls to --concurrency
+#   priority     - the ready tasks with the lowest priority start first, then in the order they were added
+#
+# Tasks can add tasks while the graph runs.  When a task fails no other task is started, and run() raises the
+# error once the running tasks have finished.
+class TaskGraph:
+
+    def __init__(self, workers, limits=None):
+        self.workers = max(1, workers)
+        self.limits = limits or {}
+        self.tasks = {}
+        self.results = {}
+        # task name -> the tasks waiting for it
+        self.dependents = {}
+        # task name -> the number of its dependencies that have not finished
+        self.waiting = {}
+        self.ready = []
+        self.order = itertools.count()
+        self.lock = threading.Lock()
+
+    def add(self, name, function, dependencies=(), kind=None, priority=0):
+        with self.lock:
+            if name in self.tasks:
+                raise Exception(f"The task {name} is already in the graph")
+            self.tasks[name] = (function, kind, priority)
+            remaining = [dependency for dependency in set(dependencies) if dependency not in self.results]
+            for dependency in remaining:
+                self.dependents.setdefault(dependency, []).append(name)
+            self.waiting[name] = len(remaining)
+            if not remaining:
+                heapq.heappush(self.ready, (priority, next(self.order), name))
+        return name
+
+    # Returns the next ready task that its kind allows to start, None when there is none
+    def next_ready(self, running_kinds):
+        skipped = []
+        task = None
+        while self.ready:
+            entry = heapq.heappop(self.ready)
+            kind = self.tasks[entry[2]][1]
+            if kind in self.limits and running_kinds.get(kind, 0) >= self.limits[kind]:
+                skipped.append(entry)
+                continue
+            task = entry[2]
+            break
+        for entry in skipped:
+            heapq.heappush(self.ready, entry)
+        return task
+
+    def finish(self, name, result):
+        with self.lock:
+            self.results[name] = result
+            for dependent in self.dependents.pop(name, []):
+                self.waiting[dependent] -= 1
+                if self.waiting[dependent] == 0:
+                    function, kind, priority = self.tasks[dependent]
+                    heapq.heappush(self.ready, (priority, next(self.order), dependent))
+
+    # Runs every task and returns the results by task name
+    def run(self):
+        running = {}
+        running_kinds = {}
+        error = None
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            while True:
+                with self.lock:
+                    while error is None and len(running) < self.workers:
+                        name = self.next_ready(running_kinds)
+                        if name is None:
+                            break
+                        function, kind, priority = self.tasks[name]
+                        running[executor.submit(function)] = name
+                        running_kinds[kind] = running_kinds.get(kind, 0) + 1
+                if not running:
+                    break
+
+                done, pending = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    kind = self.tasks[name][1]
+                    running_kinds[kind] -= 1
+                    if future.exception() is not None:
+                        error = error or future.exception()
+                    else:
+                        self.finish(name, future.result())
+
+        if error is not None:
+            raise error
+        blocked = [name for name in self.tasks if name not in self.results]
+        if blocked:
+            raise Exception(f"The tasks {', '.join(map(str, blocked[:10]))} wait for tasks that never finish")
+        return self.results
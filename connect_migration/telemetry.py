@@ -0,0 +1,137 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import json
+import sys
+import threading
+import time
+
+# Records the calls of every instrumented boto3 client per operation: the number of calls, the latency
+# of each call including its retries, the number of retries, throttled attempts and errors.
+#
+# The clients are instrumented with the botocore client events, so paginators and waiters are included.
+#   before-call      - a call starts
+#   needs-retry      - an attempt completed, throttled attempts are counted here
+#   after-call       - a call completed, successfully or with an error response
+#   after-call-error - a call failed without a response, e.g. a connection error
+
+# The error codes the AWS SDK treats as throttling
+THROTTLING_ERROR_CODES = [
+    "Throttling",
+    "ThrottlingException",
+    "ThrottledException",
+    "RequestThrottledException",
+    "TooManyRequestsException",
+    "ProvisionedThroughputExceededException",
+    "TransactionInProgressException",
+    "RequestLimitExceeded",
+    "BandwidthLimitExceeded",
+    "LimitExceededException",
+    "RequestThrottled",
+    "SlowDown",
+    "PriorRequestNotComplete",
+    "EC2ThrottledException"
+]
+
+PERCENTILES = [50, 90, 99]
+
+
+# Returns the value at a percentile of a sorted list using the nearest rank
+def percentile(values, percent):
+    if not values:
+        return 0
+    return values[max(0, -(-len(values) * percent // 100) - 1)]
+
+
+class Telemetry:
+
+    def __init__(self, live=False):
+        self.live = live
+        self.lock = threading.Lock()
+        self.reset()
+
+    # Clears the recorded calls, e.g. between the invocations of a warm Lambda function
+    def reset(self):
+        with self.lock:
+            self.operations = {}
+            self.start = time.perf_counter()
+
+    def instrument(self, client):
+        client.meta.events.register_first("before-call", self.before_call)
+        client.meta.events.register("needs-retry", self.needs_retry)
+        client.meta.events.register("after-call", self.after_call)
+        client.meta.events.register("after-call-error", self.after_call_error)
+        return client
+
+    # The event names end with <service>.<operation>, e.g. after-call.connect.DescribeContactFlow
+    def operation(self, event_name):
+        operation = ".".join(event_name.split(".")[1:3])
+        if operation not in self.operations:
+            self.operations[operation] = {
+                "calls": 0,
+                "errors": 0,
+                "retries": 0,
+                "throttles": 0,
+                "latencies": []
+            }
+        return self.operations[operation]
+
+    def before_call(self, context, **kwargs):
+        context["telemetry_start"] = time.perf_counter()
+
+    def needs_retry(self, event_name, response=None, **kwargs):
+        if response is not None and response[1].get("Error", {}).get("Code") in THROTTLING_ERROR_CODES:
+            with self.lock:
+                self.operation(event_name)["throttles"] += 1
+
+    def after_call(self, event_name, parsed, context, **kwargs):
+        retries = parsed.get("ResponseMetadata", {}).get("RetryAttempts", 0)
+        self.record(event_name, context, retries, parsed.get("Error", {}).get("Code"))
+
+    def after_call_error(self, event_name, exception, context, **kwargs):
+        self.record(event_name, context, 0, type(exception).__name__)
+
+    def record(self, event_name, context, retries, error):
+        latency = time.perf_counter() - context["telemetry_start"] if "telemetry_start" in context else 0
+        with self.lock:
+            operation = self.operation(event_name)
+            operation["calls"] += 1
+            operation["retries"] += retries
+            operation["latencies"].append(latency)
+            if error is not None:
+                operation["errors"] += 1
+        if self.live:
+            status = f" {error}" if error is not None else ""
+            retried = f" after {retries} retries" if retries else ""
+            print(f"{'.'.join(event_name.split('.')[1:3])} {latency * 1000:.1f} ms{status}{retried}", file=sys.stderr)
+
+    def report(self):
+        operations = {}
+        with self.lock:
+            for name in sorted(self.operations):
+                operation = self.operations[name]
+                latencies = sorted(operation["latencies"])
+                operations[name] = {
+                    "calls": operation["calls"],
+                    "errors": operation["errors"],
+                    "retries": operation["retries"],
+                    "throttles": operation["throttles"],
+                    "total_seconds": sum(latencies)
+                }
+                for percent in PERCENTILES:
+                    operations[name][f"p{percent}_ms"] = percentile(latencies, percent) * 1000
+                operations[name]["max_ms"] = latencies[-1] * 1000 if latencies else 0
+        return {"seconds": time.perf_counter() - self.start, "operations": operations}
+
+    def print_report(self):
+        report = self.report()
+        print(f"{'Operation':<44}{'Calls':>7}{'Errors':>8}{'Retries':>9}{'Throttles':>11}"
+              f"{'p50 ms':>9}{'p90 ms':>9}{'p99 ms':>9}{'Max ms':>9}")
+        for name, operation in report["operations"].items():
+            print(f"{name:<44}{operation['calls']:>7}{operation['errors']:>8}{operation['retries']:>9}"
+                  f"{operation['throttles']:>11}{operation['p50_ms']:>9.1f}{operation['p90_ms']:>9.1f}"
+                  f"{operation['p99_ms']:>9.1f}{operation['max_ms']:>9.1f}")
+
+    def write_report(self, filename):
+        with open(filename, "w") as file:
+            json.dump(self.report(), file, indent=4)
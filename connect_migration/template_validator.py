@@ -0,0 +1,157 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import json
+import re
+
+# Checks a generated template before it is deployed, so a broken template is found in seconds instead of after a
+# CloudFormation deployment fails.  Every resource is checked once, and every problem of the template is reported
+# together:
+#   references  - every ${Variable} of the Fn::Sub strings, every Ref and every Fn::GetAtt refers to a resource,
+#                 a parameter, a pseudo parameter or a variable of the Fn::Sub, and ${Resource.Attribute} to an
+#                 attribute of the resource
+#   identifiers - the ARNs in the content of the contact flows and modules do not keep an identifier of the
+#                 source instance that was not mapped to the destination instance, e.g. an audio prompt that is
+#                 not in the manifest file
+#   limits      - the logical ids, the number of resources, the size of the template and the size of the
+#                 properties are within the limits of CloudFormation and Connect
+#
+# The resources are checked one at a time, so the streaming export can check each resource as it is written.  The
+# references are resolved by finish() once every resource is known.
+
+# CloudFormation allows 500 resources per stack and 1 MB for a template uploaded to S3
+MAX_RESOURCES = 500
+MAX_TEMPLATE_SIZE = 1000000
+
+LOGICAL_ID = re.compile(r'^[A-Za-z0-9]{1,255}$')
+
+PSEUDO_PARAMETERS = ["AWS::AccountId", "AWS::NotificationARNs", "AWS::NoValue", "AWS::Partition", "AWS::Region",
+                     "AWS::StackId", "AWS::StackName", "AWS::URLSuffix"]
+
+# The maximum length of the properties of the Connect resources
+PROPERTY_LIMITS = {
+    "AWS::Connect::ContactFlow": {"Name": 127, "Description": 500, "Content": 256000},
+    "AWS::Connect::ContactFlowModule": {"Name": 127, "Description": 500, "Content": 256000},
+    "AWS::Connect::HoursOfOperation": {"Name": 127, "Description": 250}
+}
+
+# The attributes of the Connect resources for Fn::GetAtt.  The attributes of the other resources are not checked.
+RESOURCE_ATTRIBUTES = {
+    "AWS::Connect::ContactFlow": ["ContactFlowArn"],
+    "AWS::Connect::ContactFlowModule": ["ContactFlowModuleArn", "Status"],
+    "AWS::Connect::HoursOfOperation": ["HoursOfOperationArn"]
+}
+
+# Matches the variables of a Fn::Sub string.  ${!Literal} is not a variable.
+SUB_VARIABLE = re.compile(r'\$\{(?!!)([^}]*)\}')
+
+GUID = "[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}"
+
+# Matches the identifiers in the ARNs of the resources of the instance, e.g.
+# arn:${AWS::Partition}:connect:${AWS::Region}:${AWS::AccountId}:instance/${ConnectInstanceID}/queue/<identifier>
+INSTANCE_ARN = re.compile(r'instance/\$\{ConnectInstanceID\}/(contact-flow|flow-module|operating-hours|prompt|queue)/'
+                          f'({GUID})')
+
+
+class TemplateValidator:
+
+    # is_mapped(arn_type, id) - True when the identifier in an ARN of the content is an identifier of the
+    #                           destination instance
+    # limits                  - False to skip the number of resources and the size of the template, e.g. when the
+    #                           template is split into nested stacks
+    def __init__(self, is_mapped, limits=True):
+        self.is_mapped = is_mapped
+        self.limits = limits
+        self.resources = {}
+        # (resource, target, attribute, how it is referenced) for every reference, resolved by finish()
+        self.references = {}
+        self.problems = {}
+
+    def problem(self, message):
+        self.problems[message] = None
+
+    def check_resource(self, name, resource):
+        self.resources[name] = resource["Type"]
+        if not LOGICAL_ID.match(name):
+            self.problem(f"{name}: the logical id must be 1 to 255 letters and digits")
+
+        properties = resource.get("Properties", {})
+        for property, limit in PROPERTY_LIMITS.get(resource["Type"], {}).items():
+            value = sub_string(properties.get(property)) or properties.get(property)
+            if isinstance(value, str) and len(value) > limit:
+                self.problem(f"{name}: {property} is {len(value)} characters, the limit is {limit}")
+
+        content = sub_string(properties.get("Content"))
+        if content is not None:
+            for arn_type, id in INSTANCE_ARN.findall(content):
+                if not self.is_mapped(arn_type, id):
+                    self.problem(f"{name}: the {arn_type} {id} of the source instance is not mapped to the "
+                                 "destination instance")
+
+        self.walk(name, resource)
+
+    # Records the references of a value of the resource
+    def walk(self, name, value):
+        if isinstance(value, list):
+            for item in value:
+                self.walk(name, item)
+        if not isinstance(value, dict):
+            return
+        for key, item in value.items():
+            if key == "Ref" and isinstance(item, str):
+                self.references[(name, item, None, f"Ref {item}")] = None
+            elif key == "Fn::GetAtt":
+                target, attribute = item.split(".", 1) if isinstance(item, str) else item
+                self.references[(name, target, attribute, f"Fn::GetAtt {target}.{attribute}")] = None
+            elif key == "Fn::Sub":
+                string, variables = (item, {}) if isinstance(item, str) else item
+                for variable in SUB_VARIABLE.findall(string):
+                    if variable in variables:
+                        continue
+                    target, separator, attribute = variable.partition(".")
+                    self.references[(name, target, attribute if separator else None, "${" + variable + "}")] = None
+                self.walk(name, variables)
+            else:
+                self.walk(name, item)
+
+    # Resolves the references and returns every problem of the template.  size is the size of the written
+    # template in bytes.
+    def finish(self, parameters, size):
+        for name, target, attribute, reference in self.references:
+            if attribute is None and (target in self.resources or target in parameters
+                                      or target in PSEUDO_PARAMETERS):
+                continue
+            if attribute is not None and target in self.resources:
+                attributes = RESOURCE_ATTRIBUTES.get(self.resources[target])
+                if attributes is not None and attribute not in attributes:
+                    self.problem(f"{name}: {reference} refers to the attribute {attribute} that "
+                                 f"{self.resources[target]} does not have")
+                continue
+            if attribute is not None:
+                self.problem(f"{name}: {reference} does not refer to a resource")
+            else:
+                self.problem(f"{name}: {reference} does not refer to a resource, parameter or pseudo parameter")
+
+        if self.limits and len(self.resources) > MAX_RESOURCES:
+            self.problem(f"The template has {len(self.resources)} resources, the limit is {MAX_RESOURCES}. "
+                         "Split it with --nested-stacks or select fewer resources")
+        if self.limits and size > MAX_TEMPLATE_SIZE:
+            self.problem(f"The template is {size} bytes, the limit is {MAX_TEMPLATE_SIZE}. "
+                         "Split it with --nested-stacks or select fewer resources")
+        return list(self.problems)
+
+
+# Returns the Fn::Sub string of a property, None when it is not a Fn::Sub
+def sub_string(value):
+    if not isinstance(value, dict) or "Fn::Sub" not in value:
+        return None
+    return value["Fn::Sub"] if isinstance(value["Fn::Sub"], str) else value["Fn::Sub"][0]
+
+
+# Checks a complete template and returns its problems
+def validate_template(template, is_mapped, limits=True):
+    validator = TemplateValidator(is_mapped, limits)
+    for name, resource in template["Resources"].items():
+        validator.check_resource(name, resource)
+    size = len(json.dumps(template, indent=4, default=str)) if limits else 0
+    return validator.finish(template.get("Parameters", {}), size)
@@ -1,163 +1,50 @@
-import boto3
+import argparse
 import os
 import sys
 import json
-import pydash as _
-
-mapping = {}
+from connect_migration import clients
+from connect_migration.profiler import profiler
+from connect_migration.source_manifest import SECTIONS, create_manifest, parse_sections, print_statistics, \
+    write_manifest
+
+# Creates the manifest file of the resources in a Connect instance.  The listing is implemented in
+# connect_migration/source_manifest.py, so it can also be run from other Python code.
+
+parser = argparse.ArgumentParser(description="Creates a manifest file of the resources in a Connect instance")
+parser.add_argument("--concurrency", type=int, default=10,
+                    help="number of list calls to run in parallel (default: 10)")
+parser.add_argument("--types", metavar="TYPES",
+                    help="comma separated resource types to list again, e.g. Queue,Prompt.  The other sections of the "
+                         f"existing manifest file are kept.  One of {', '.join(SECTIONS)} (default: every type)")
+rate_limit_group = parser.add_mutually_exclusive_group()
+rate_limit_group.add_argument("--rate-limit", dest="rate_limit", action="store_const", const=True,
+                              help="limit the rate of the API calls to the RateLimits of config.json or the default limits")
+rate_limit_group.add_argument("--no-rate-limit", dest="rate_limit", action="store_const", const=False,
+                              help="do not limit the rate of the API calls, even if RateLimits is set in config.json")
+parser.add_argument("--telemetry-report", metavar="FILE",
+                    help="write the API call telemetry to FILE as JSON")
+parser.add_argument("--telemetry-live", action="store_true",
+                    help="print every API call with its latency to stderr")
+parser.add_argument("--profile-stages", action="store_true",
+                    help="print the time and memory of every stage of the script at the end of the run")
+parser.add_argument("--profile-stages-dump", metavar="FILE",
+                    help="write cProfile statistics of the run to FILE, implies --profile-stages")
+args = parser.parse_args()
+
+if args.profile_stages or args.profile_stages_dump is not None:
+    profiler.start(args.profile_stages_dump)
 
 with open(os.path.join(sys.path[0], 'config.json'), "r") as file:
     config = json.load(file)
 
-client = boto3.client('connect')
-
-
-def get_types():
-    paginator = client.get_paginator('list_contact_flow_modules')
-    mapping["ContactFlowModulesSummaryList"] = {}
-    for page in paginator.paginate(InstanceId=config["Output"]["ConnectInstanceId"],
-                                   ContactFlowModuleState="active",
-                                   PaginationConfig={
-                                                     "MaxItems": 50,
-                                                     "PageSize": 50,
-                                    }):
-        for module in page["ContactFlowModulesSummaryList"]:
-            mapping["ContactFlowModulesSummaryList"][module["Name"]] = {
-                "Arn": module["Arn"],
-                "Id": module["Id"]
-            }
-
-    paginator = client.get_paginator('list_contact_flows')
-    for page in paginator.paginate(InstanceId=config["Output"]["ConnectInstanceId"],
-                                   ContactFlowTypes=['CONTACT_FLOW',
-                                                     'CUSTOMER_QUEUE',
-                                                     'CUSTOMER_HOLD',
-                                                     'CUSTOMER_WHISPER',
-                                                     'AGENT_HOLD',
-                                                     'AGENT_WHISPER',
-                                                     'OUTBOUND_WHISPER',
-                                                     'AGENT_TRANSFER',
-                                                     'QUEUE_TRANSFER'],
-                                   PaginationConfig={
-                                                     "MaxItems": 50,
-                                                     "PageSize": 50,
-                                    }):
-        mapping["ContactFlowSummaryList"] = {}
-        for module in page["ContactFlowSummaryList"]:
-            print(module)
-            mapping["ContactFlowSummaryList"][module["Name"]] = {
-                "Arn": module["Arn"],
-                "Id": module["Id"]
-            }
-
-    paginator = client.get_paginator('list_hours_of_operations')
-    for page in paginator.paginate(InstanceId=config["Output"]["ConnectInstanceId"],
-                                   PaginationConfig={
-                                                     "MaxItems": 50,
-                                                     "PageSize": 50,
-                                    }):
-        mapping["HoursOfOperationSummaryList"] = {}
-        for module in page["HoursOfOperationSummaryList"]:
-            mapping["HoursOfOperationSummaryList"][module["Name"]] = module["Arn"]
-
-    paginator = client.get_paginator('list_phone_numbers')
-    for page in paginator.paginate(InstanceId=config["Output"]["ConnectInstanceId"],
-                                   PhoneNumberTypes=["TOLL_FREE", "DID"],
-                                   PaginationConfig={
-                                                     "MaxItems": 50,
-                                                     "PageSize": 50,
-                                    }):
-        mapping["PhoneNumberSummaryList"] = {}
-        for module in page["PhoneNumberSummaryList"]:
-            mapping["PhoneNumberSummaryList"][module["PhoneNumber"]] = {
-                "Arn": module["Arn"],
-                "Name": module["PhoneNumber"]
-            }
-
-    paginator = client.get_paginator('list_prompts')
-    for page in paginator.paginate(InstanceId=config["Output"]["ConnectInstanceId"],
-                                   PaginationConfig={
-                                                     "MaxItems": 50,
-                                                     "PageSize": 50,
-                                    }):
-        mapping["PromptSummaryList"] = {}
-        for module in page["PromptSummaryList"]:
-            mapping["PromptSummaryList"][module["Name"]] = {
-                "Arn": module["Arn"],
-                "Id": module["Id"]
-            }
-
-    paginator = client.get_paginator('list_queues')
-    for page in paginator.paginate(InstanceId=config["Output"]["ConnectInstanceId"],
-                                   QueueTypes=["STANDARD", "AGENT"],
-                                   PaginationConfig={
-                                                     "MaxItems": 50,
-                                                     "PageSize": 50,
-                                    }):
-        mapping["QueueSummaryList"] = {}
-        for module in page["QueueSummaryList"]:
-            if "Name" not in module:
-                continue
-            mapping["QueueSummaryList"][module["Name"]] = {
-                "Arn": module["Arn"],
-                "Id": _.get(module, "Id")
-            }
-    paginator = client.get_paginator('list_quick_connects')
-    for page in paginator.paginate(InstanceId=config["Output"]["ConnectInstanceId"],
-                                   QuickConnectTypes=["USER", "QUEUE", "PHONE_NUMBER"],
-                                   PaginationConfig={
-                                                     "MaxItems": 50,
-                                                     "PageSize": 50,
-                                    }):
-        mapping["QuickConnectSummaryList"] = {}
-        for module in page["QuickConnectSummaryList"]:
-            mapping["QuickConnectSummaryList"][module["Name"]] = {
-                "Arn": module["Arn"],
-                "Id": module["Id"]
-            }
-
-    paginator = client.get_paginator('list_routing_profiles')
-    for page in paginator.paginate(InstanceId=config["Output"]["ConnectInstanceId"],
-                                   PaginationConfig={
-                                                     "MaxItems": 50,
-                                                     "PageSize": 50,
-                                    }):
-        mapping["RoutingProfileSummaryList"] = {}
-        for module in page["RoutingProfileSummaryList"]:
-            mapping["RoutingProfileSummaryList"][module["Name"]] = {
-                "Arn": module["Arn"],
-                "Id": module["Id"]
-            }
-
-    lexv2_client = boto3.client('lexv2-models')
-    response = lexv2_client.list_bots()
-    bot_definitions = {}
-    while(True):
-        for bot_definition in response["botSummaries"]:
-            bot_definitions[bot_definition["botName"]] = {
-                "botId": bot_definition["botId"],
-                "botName": bot_definition["botName"],
-                "botAliases": []
-            }
-        if "nextToken" not in response:
-            break
-        response = lexv2_client.list_bots(nextToken=response["nextToken"])
-
-    for bot_name in bot_definitions:
-        response = lexv2_client.list_bot_aliases(botId=bot_definitions[bot_name]["botId"])
-        while(True):
-            for bot_alias in response["botAliasSummaries"]:
-                bot_definitions[bot_name]["botAliases"].append({
-                    "botAliasId": bot_alias["botAliasId"],
-                    "botAliasName": bot_alias["botAliasName"]
-                })
-            if "nextToken" not in response:
-                break
-            response = lexv2_client.list_bot_aliases(botId=bot_definitions[bot_name]["botId"])
-
-    mapping["LexBotSummaries"] = bot_definitions
-
-
-get_types()
-with open(os.path.join(sys.path[0], config["Output"]["ManifestFileName"]), 'w') as f:
-    json.dump(mapping, f, indent=4, default=str)
+clients.configure(config, rate_limit=args.rate_limit, telemetry_live=args.telemetry_live)
+
+sections = parse_sections(args.types) if args.types is not None else None
+mapping, statistics = create_manifest(config, concurrency=args.concurrency, sections=sections)
+with profiler.stage("write"):
+    write_manifest(os.path.join(sys.path[0], config["Output"]["ManifestFileName"]), mapping)
+print_statistics(statistics)
+clients.telemetry.print_report()
+if args.telemetry_report is not None:
+    clients.telemetry.write_report(args.telemetry_report)
+profiler.print_report()